@@ -1,15 +1,50 @@
+import time
+_import_start = time.perf_counter()
+
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from backend.config.config import Config
-from backend.app.api import init_api
 from backend.app.services.detection import detection_service
 import logging
+import threading
 from logging.handlers import RotatingFileHandler
 import os
 
-def create_app():
-    """创建Flask应用实例"""
+# 导入本包（不含模型权重）的耗时
+IMPORT_TIME = time.perf_counter() - _import_start
+
+PRELOAD_MODES = ('sync', 'background', 'lazy')
+
+def _load_default_model(app, warmup):
+    """加载默认模型并按需预热，记录耗时"""
+    start = time.perf_counter()
+    app.logger.info('正在加载默认模型...')
+    if detection_service.load_model():
+        app.logger.info('默认模型加载成功')
+    else:
+        app.logger.error('默认模型加载失败，请检查模型文件是否正确')
+        return
+    app.config['STARTUP_TIMINGS']['model_load_ms'] = (time.perf_counter() - start) * 1000.0
+    
+    if warmup:
+        start = time.perf_counter()
+        detection_service.warmup()
+        app.config['STARTUP_TIMINGS']['warmup_ms'] = (time.perf_counter() - start) * 1000.0
+
+def create_app(preload=None, warmup=None):
+    """创建Flask应用实例
+    Args:
+        preload: 默认模型的加载时机 sync / background / lazy，默认取 Config.MODEL_PRELOAD。
+            导入本包和创建应用本身都不会加载模型权重。
+        warmup: 模型加载后是否预热，默认取 Config.WARMUP_ENABLED
+    """
+    start = time.perf_counter()
+    preload = preload or Config.MODEL_PRELOAD
+    warmup = Config.WARMUP_ENABLED if warmup is None else warmup
+    if preload not in PRELOAD_MODES:
+        raise ValueError(f"不支持的模型加载方式: {preload}")
     app = Flask(__name__, static_folder='../../frontend/dist', static_url_path='')
+    app.config['STARTUP_TIMINGS'] = {'import_ms': IMPORT_TIME * 1000.0, 'model_preload': preload}
     
     # 配置跨域
     CORS(app)
@@ -63,14 +98,17 @@ def create_app():
         def serve_static(path):
             return send_from_directory(app.static_folder, path)
         
-        # 在应用上下文中初始化检测服务
-        with app.app_context():
-            app.logger.info('正在加载默认模型...')
-            if detection_service.load_model():
-                app.logger.info('默认模型加载成功')
-            else:
-                app.logger.error('默认模型加载失败，请检查模型文件是否正确')
-            
+        app.config['STARTUP_TIMINGS']['create_app_ms'] = (time.perf_counter() - start) * 1000.0
+        
+        # 加载默认模型（检测服务导入时不再加载，此处是唯一的预加载入口）
+        detection_service.preload_mode = preload
+        if preload == 'sync':
+            _load_default_model(app, warmup)
+        elif preload == 'background':
+            threading.Thread(target=_load_default_model, args=(app, warmup),
+                             name='model-preload', daemon=True).start()
+        
+        app.logger.info(f"启动耗时: {app.config['STARTUP_TIMINGS']}")
         return app
         
     except Exception as e:
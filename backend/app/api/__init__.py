@@ -1,3 +1,4 @@
+import time
 from flask import Blueprint, jsonify, request
 from .detection import detection_bp
 from ..services.detection import detection_service
@@ -18,7 +19,10 @@ def init_api(app):
                 'success': True,
                 'data': {
                     'current_model': status.get('current_model'),
-                    'is_loaded': status.get('loaded', False)
+                    'is_loaded': status.get('loaded', False),
+                    'model_info': status.get('current_model_info'),
+                    'resident_models': status.get('resident_models', {}),
+                    'resident_memory_bytes': status.get('resident_memory_bytes', 0)
                 }
             })
         except Exception as e:
@@ -28,5 +32,31 @@ def init_api(app):
                 'error': f"获取当前模型信息失败: {str(e)}"
             }), 500
     
+    # 健康检查：存活探针只反映进程可响应，就绪探针要求模型已加载且预热完成
+    started_at = time.time()
+    
+    @api_bp.route('/health/live', methods=['GET'])
+    def liveness():
+        return jsonify({
+            'success': True,
+            'data': {
+                'status': 'alive',
+                'uptime_s': time.time() - started_at
+            }
+        })
+    
+    @api_bp.route('/health/ready', methods=['GET'])
+    def readiness():
+        ready = detection_service.is_ready()
+        return jsonify({
+            'success': ready,
+            'data': {
+                'status': 'ready' if ready else 'not_ready',
+                'model_loaded': detection_service.model is not None,
+                'warmup': detection_service.get_warmup_status(),
+                'startup_timings': app.config.get('STARTUP_TIMINGS', {})
+            }
+        }), 200 if ready else 503
+    
     return api_bp
     
\ No newline at end of file
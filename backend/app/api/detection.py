@@ -1,67 +1,416 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from backend.app.core.security import require_auth
 from backend.app.services.detection import detection_service
+from backend.app.services.ingest import read_image_stream
+from backend.app.services.encoding import get_encoder
+from backend.app.services.jobs import Job, QueueFullError
+from backend.config.config import Config
 import os
 import gc
+import json
+import base64
+import zipfile
 
 detection_bp = Blueprint('detection', __name__)
 
+# 批量检测时从ZIP中读取的图片扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+def _compact_options(params):
+    """解析紧凑响应参数 response=compact 和 thumbnail=<最长边>
+    Returns:
+        (是否紧凑格式, 缩略图最长边或None)
+    """
+    compact = params.get('response', 'full').lower() == 'compact'
+    thumbnail_size = params.get('thumbnail', type=int) if compact else None
+    return compact, thumbnail_size
+
+def _render_requested():
+    """表单参数 render=0/false 时只返回检测结果，标注图像通过 /render 按需获取
+
+    紧凑格式由前端绘制标注，指定了 image_format 时标注图像另行按格式渲染，
+    二者默认都不生成默认格式的标注图像。
+    """
+    params = request.form
+    lazy = _compact_options(params)[0] or params.get('image_format')
+    return params.get('render', 'false' if lazy else 'true').lower() not in ('0', 'false', 'no')
+
+def _validate_format_options(params):
+    """在提交检测之前校验 image_format / image_quality / thumbnail 参数
+    Returns:
+        错误信息，参数合法时返回None
+    """
+    image_format = params.get('image_format')
+    quality = params.get('image_quality')
+    if quality is not None:
+        try:
+            quality = int(quality)
+        except ValueError:
+            return f'图像质量参数必须为整数: {quality}'
+    if image_format:
+        try:
+            get_encoder(image_format, quality)
+        except ValueError as e:
+            return str(e)
+    thumbnail = params.get('thumbnail')
+    if thumbnail is not None and (not thumbnail.isdigit() or int(thumbnail) <= 0):
+        return f'缩略图尺寸必须为正整数: {thumbnail}'
+    return None
+
+def _format_result(result, params):
+    """按请求参数返回完整结果或紧凑结果
+
+    完整结果可通过 image_format=png|jpeg|webp 和 image_quality 指定标注图像的编码。
+    """
+    compact, thumbnail_size = _compact_options(params)
+    if compact:
+        return detection_service.to_compact_result(result, thumbnail_size)
+    image_format = params.get('image_format')
+    if image_format and result.get('success') and result['data'].get('render_token'):
+        image_bytes, mimetype = detection_service.render_image(
+            result['data']['render_token'], image_format, params.get('image_quality', type=int))
+        data = dict(result['data'])
+        data['detected_image'] = base64.b64encode(image_bytes).decode('utf-8')
+        data['detected_image_format'] = mimetype
+        return {'success': result['success'], 'data': data}
+    return result
+
+def _detect_error(message, status, result=None):
+    """检测接口统一的错误响应
+
+    Args:
+        message: 错误信息
+        status: HTTP状态码
+        result: 可选的检测结果，指定时保留其中的检测框和已存储的标注图像
+    """
+    data = {'detections': [], 'class_counts': {}}
+    if result is not None:
+        data.update(result['data'])
+    data['message'] = message
+    return jsonify({'success': False, 'data': data}), status
+
+def _format_response(result, params):
+    """格式化检测结果并生成响应
+
+    重新编码所需的缓存条目或原图已被淘汰时返回410，并附带已存储的标注图像。
+    """
+    try:
+        return jsonify(_format_result(result, params))
+    except KeyError as e:
+        return _detect_error(e.args[0] if e.args else str(e), 410, result)
+
+def _submit_detection_job(rules_checker=None, queue_timeout=None):
+    """校验上传参数并提交异步检测任务
+    Args:
+        rules_checker: 可选的规则检查器，指定时任务结果同时包含规则检查结果
+        queue_timeout: 任务队列满时最多等待的秒数，为 None 时立即返回429
+    Returns:
+        (job, error_response)，二者之一为None
+    """
+    if 'file' not in request.files:
+        return None, _detect_error('未找到上传的文件', 400)
+    
+    file = request.files['file']
+    if not file:
+        return None, _detect_error('文件为空', 400)
+    
+    # 获取可选的模型路径参数和检测模式（single / cascade / tiled）
+    model_path = request.form.get('model_path')
+    mode = request.form.get('mode')
+    if mode and mode not in detection_service.DETECTION_MODES:
+        return None, _detect_error(f'不支持的检测模式: {mode}', 400)
+    format_error = _validate_format_options(request.form)
+    if format_error:
+        return None, _detect_error(format_error, 400)
+    # 只接受已注册的模型名称，不加载客户端指定的任意文件
+    if model_path and not detection_service.has_model(model_path):
+        return None, _detect_error(f'模型 {model_path} 不存在', 400)
+    
+    # 大文件直接映射 werkzeug 落盘的临时文件；映射在文件关闭、删除后依然有效，
+    # 任务可在请求结束后执行，预处理阶段释放对缓冲区的引用后映射随之解除
+    image_buffer = read_image_stream(file.stream)
+    if image_buffer.size == 0:
+        return None, _detect_error('文件为空', 400)
+    
+    try:
+        return detection_service.submit_job(image_buffer, model_path, mode=mode, render=_render_requested(),
+                                            rules_checker=rules_checker, queue_timeout=queue_timeout), None
+    except QueueFullError as e:
+        return None, _detect_error(str(e), 429)
+
 @detection_bp.route('/detect', methods=['POST'])
 def detect():
+    """同步检测：提交任务后等待其完成"""
+    try:
+        # 同步接口在任务队列满时排队等待，不返回429
+        job, error = _submit_detection_job(queue_timeout=Config.JOB_SYNC_TIMEOUT)
+        if error is not None:
+            return error
+        
+        if not job.wait(Config.JOB_SYNC_TIMEOUT):
+            # 超时后任务继续执行，客户端可改为轮询任务状态
+            response = job.to_dict()
+            response['message'] = '检测仍在进行中，请通过任务接口查询结果'
+            return jsonify({'success': True, 'data': response}), 202
+        if job.status == Job.FAILED:
+            return _detect_error(f"检测失败: {job.error}", 500)
+        return _format_response(job.result, request.form)
+        
+    except Exception as e:
+        current_app.logger.error(f"检测过程出错: {str(e)}", exc_info=True)
+        return _detect_error(f"检测失败: {str(e)}", 500)
+
+@detection_bp.route('/detect-and-check', methods=['POST'])
+def detect_and_check():
+    """检测并检查施工规范：一次请求返回检测结果和规则检查结果
+
+    规则检查直接使用服务端内存中的检测结果，与标注图像的绘制和编码并行执行，
+    参数与 /detect 相同，规则检查结果位于 data.rule_results。
+    """
+    try:
+        from backend.app.main import get_rules_checker
+        job, error = _submit_detection_job(get_rules_checker(), queue_timeout=Config.JOB_SYNC_TIMEOUT)
+        if error is not None:
+            return error
+        
+        if not job.wait(Config.JOB_SYNC_TIMEOUT):
+            response = job.to_dict()
+            response['message'] = '检测仍在进行中，请通过任务接口查询结果'
+            return jsonify({'success': True, 'data': response}), 202
+        if job.status == Job.FAILED:
+            return _detect_error(f"检测失败: {job.error}", 500)
+        try:
+            result = _format_result(job.result, request.form)
+        except KeyError as e:
+            return _detect_error(e.args[0] if e.args else str(e), 410, job.result)
+        # 紧凑格式只保留检测相关字段，补回规则检查结果
+        result['data'].setdefault('rule_results', job.result['data']['rule_results'])
+        return jsonify(result)
+        
+    except Exception as e:
+        current_app.logger.error(f"检测并检查规则出错: {str(e)}", exc_info=True)
+        return _detect_error(f"检测失败: {str(e)}", 500)
+
+@detection_bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """提交异步检测任务，立即返回任务ID"""
     try:
-        if 'file' not in request.files:
+        job, error = _submit_detection_job()
+        if error is not None:
+            return error
+        return jsonify({'success': True, 'data': job.to_dict()}), 202
+    except Exception as e:
+        current_app.logger.error(f"提交检测任务出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'提交检测任务失败: {str(e)}'
+        }), 500
+
+@detection_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """查询异步检测任务的状态和进度"""
+    job = detection_service.get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'任务 {job_id} 不存在或已过期'
+        }), 404
+    return jsonify({'success': True, 'data': job.to_dict()})
+
+@detection_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """获取异步检测任务的结果，任务未完成时返回202
+    
+    查询参数 response=compact 返回紧凑格式，thumbnail=<最长边> 附带预览缩略图。
+    """
+    job = detection_service.get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'任务 {job_id} 不存在或已过期'
+        }), 404
+    if not job.finished:
+        return jsonify({'success': True, 'data': job.to_dict()}), 202
+    if job.status == Job.FAILED:
+        return _detect_error(f"检测失败: {job.error}", 500)
+    format_error = _validate_format_options(request.args)
+    if format_error:
+        return _detect_error(format_error, 400)
+    return _format_response(job.result, request.args)
+
+@detection_bp.route('/jobs/stats', methods=['GET'])
+def get_job_stats():
+    """获取异步检测任务统计信息"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': detection_service.get_job_stats()
+        })
+    except Exception as e:
+        current_app.logger.error(f"获取任务统计时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'获取任务统计失败: {str(e)}'
+        }), 500
+
+class UploadLimitError(Exception):
+    """批量上传超过数量或大小限制"""
+
+def _collect_batch_images():
+    """读取批量上传的图片，支持多个 files 字段或单个ZIP压缩包
+
+    ZIP条目在解压前按条目数、图片数和声明的解压后大小检查限制，
+    超限时立即停止，不会把压缩炸弹读入内存。
+    Returns:
+        [(文件名, 图像字节)] 列表
+    Raises:
+        UploadLimitError: 超过 BATCH_UPLOAD_* 限制
+    """
+    images = []
+    total_bytes = 0
+    
+    def add(size):
+        nonlocal total_bytes
+        if len(images) >= Config.BATCH_UPLOAD_MAX_FILES:
+            raise UploadLimitError(f'图片数量超过上限 {Config.BATCH_UPLOAD_MAX_FILES}')
+        total_bytes += size
+        if total_bytes > Config.BATCH_UPLOAD_MAX_TOTAL_BYTES:
+            raise UploadLimitError(f'图片总大小超过上限 {Config.BATCH_UPLOAD_MAX_TOTAL_BYTES} 字节')
+    
+    for file in request.files.getlist('files') + request.files.getlist('file'):
+        if not file or not file.filename:
+            continue
+        if file.filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                entries = archive.infolist()
+                if len(entries) > Config.BATCH_UPLOAD_MAX_ZIP_ENTRIES:
+                    raise UploadLimitError(f'ZIP条目数超过上限 {Config.BATCH_UPLOAD_MAX_ZIP_ENTRIES}')
+                for info in entries:
+                    name = info.filename
+                    if (info.is_dir() or name.startswith('__MACOSX/')
+                            or not name.lower().endswith(IMAGE_EXTENSIONS) or info.file_size == 0):
+                        continue
+                    if info.file_size > Config.BATCH_UPLOAD_MAX_IMAGE_BYTES:
+                        raise UploadLimitError(f'{name} 解压后大小超过上限 {Config.BATCH_UPLOAD_MAX_IMAGE_BYTES} 字节')
+                    # 解压读取的字节数不会超过条目声明的 file_size
+                    add(info.file_size)
+                    images.append((name, archive.read(info)))
+        else:
+            data = file.read()
+            if data:
+                add(len(data))
+                images.append((file.filename, data))
+    return images
+
+@detection_bp.route('/detect/batch', methods=['POST'])
+def detect_batch():
+    """批量检测，以NDJSON逐行返回结果
+
+    每行对应一张图片，按完成顺序输出，最后一行为汇总信息。
+    """
+    try:
+        mode = request.form.get('mode')
+        if mode and mode not in detection_service.DETECTION_MODES:
             return jsonify({
                 'success': False,
-                'data': {
-                    'detections': [],
-                    'class_counts': {},
-                    'message': '未找到上传的文件'
-                }
+                'error': f'不支持的检测模式: {mode}'
             }), 400
-        
-        file = request.files['file']
-        if not file:
+        model_path = request.form.get('model_path')
+        if model_path and not detection_service.has_model(model_path):
             return jsonify({
                 'success': False,
-                'data': {
-                    'detections': [],
-                    'class_counts': {},
-                    'message': '文件为空'
-                }
+                'error': f'模型 {model_path} 不存在'
+            }), 400
+        format_error = _validate_format_options(request.form)
+        if format_error:
+            return jsonify({
+                'success': False,
+                'error': format_error
             }), 400
-        
-        # 获取可选的模型路径参数
-        model_path = request.form.get('model_path')
-        
-        # 保存上传的文件
-        import tempfile
-        import os
-        
-        # 创建临时文件
-        temp_dir = tempfile.mkdtemp()
-        temp_path = os.path.join(temp_dir, file.filename)
-        file.save(temp_path)
         
         try:
-            # 处理图片
-            result = detection_service.process_image(temp_path, model_path)
-            return jsonify(result)
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
-        
+            images = _collect_batch_images()
+        except zipfile.BadZipFile:
+            return jsonify({
+                'success': False,
+                'error': 'ZIP文件格式错误'
+            }), 400
+        except UploadLimitError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 413
+        if not images:
+            return jsonify({
+                'success': False,
+                'error': '未找到上传的图片'
+            }), 400
     except Exception as e:
-        current_app.logger.error(f"检测过程出错: {str(e)}", exc_info=True)
+        current_app.logger.error(f"批量检测读取文件出错: {str(e)}", exc_info=True)
         return jsonify({
             'success': False,
-            'data': {
-                'detections': [],
-                'class_counts': {},
-                'message': f"检测失败: {str(e)}"
-            }
+            'error': f'批量检测失败: {str(e)}'
+        }), 500
+    
+    render = _render_requested()
+    form = request.form.copy()
+    
+    def generate():
+        failed = 0
+        for index, filename, result in detection_service.process_images(images, model_path, mode=mode,
+                                                                        render=render):
+            line = {'type': 'result', 'index': index, 'filename': filename}
+            try:
+                line.update(_format_result(result, form))
+            except Exception as e:
+                # 单张图片的格式化失败只影响该行，不中断整个响应流
+                current_app.logger.error(f"批量检测格式化 {filename} 的结果失败: {str(e)}")
+                line.update({'success': False, 'error': str(e)})
+            if not line.get('success'):
+                failed += 1
+            yield json.dumps(line, ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'type': 'summary',
+            'total': len(images),
+            'succeeded': len(images) - failed,
+            'failed': failed
+        }, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@detection_bp.route('/render/<render_token>', methods=['GET'])
+def render_detection(render_token):
+    """按需渲染标注图像
+    
+    查询参数: format=png|jpeg|webp, quality=PNG压缩级别(0-9)或JPEG/WebP质量(1-100), scale=(0,1]
+    """
+    # 令牌会作为缓存键拼接分片路径，只接受MD5格式
+    if not detection_service.is_render_token(render_token):
+        return jsonify({
+            'success': False,
+            'error': f'检测结果 {render_token} 不存在或已过期'
+        }), 404
+    try:
+        fmt = request.args.get('format')
+        quality = request.args.get('quality', type=int)
+        scale = request.args.get('scale', 1.0, type=float)
+        image_bytes, mimetype = detection_service.render_image(render_token, fmt, quality, scale)
+        return Response(image_bytes, mimetype=mimetype)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': e.args[0] if e.args else str(e)
+        }), 404
+    except Exception as e:
+        current_app.logger.error(f"渲染标注图像出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'渲染标注图像失败: {str(e)}'
         }), 500
 
 @detection_bp.route('/analyze', methods=['POST'])
@@ -81,7 +430,7 @@ def analyze():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-@detection_bp.route('/detect', methods=['POST'])
+@detection_bp.route('/model/switch', methods=['POST'])
 # @require_auth  # 暂时注释掉鉴权
 def switch_model():
     """切换模型"""
@@ -96,6 +445,14 @@ def switch_model():
         
         model_name = data['model_name']
         
+        # 切换只作用于处理本次请求的工作进程，多进程部署时各进程的当前模型会不一致
+        if detection_service.server_workers > 1:
+            return jsonify({
+                'success': False,
+                'error': f'当前运行 {detection_service.server_workers} 个工作进程，不支持在线切换模型，'
+                         f'请通过环境变量 MODEL_PATH 指定模型后重启服务'
+            }), 409
+        
         # 检查模型是否存在
         status = detection_service.get_model_status()
         available_models = status.get('available_models', {})
@@ -105,11 +462,8 @@ def switch_model():
                 'error': f'模型 {model_name} 不存在'
             }), 404
         
-        # 获取模型路径
-        model_path = available_models[model_name]['path']
-        
-        # 切换模型
-        success = detection_service.switch_model(model_path)
+        # 切换模型，加载完成后原子替换，不阻塞正在处理的请求
+        success = detection_service.switch_model(model_name)
         if success:
             return jsonify({
                 'success': True,
@@ -126,4 +480,85 @@ def switch_model():
         return jsonify({
             'success': False,
             'error': f'切换模型失败: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@detection_bp.route('/batching/stats', methods=['GET'])
+def get_batching_stats():
+    """获取动态微批处理统计信息"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': detection_service.get_batching_stats()
+        })
+    except Exception as e:
+        current_app.logger.error(f"获取批处理统计时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'获取批处理统计失败: {str(e)}'
+        }), 500
+
+@detection_bp.route('/pipeline/stats', methods=['GET'])
+def get_pipeline_stats():
+    """获取检测流水线各阶段的队列深度与耗时"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': detection_service.get_pipeline_stats()
+        })
+    except Exception as e:
+        current_app.logger.error(f"获取流水线统计时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'获取流水线统计失败: {str(e)}'
+        }), 500
+
+@detection_bp.route('/encoder/stats', methods=['GET'])
+def get_encoder_stats():
+    """获取标注图像编码的耗时与字节统计"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': detection_service.get_encoder_stats()
+        })
+    except Exception as e:
+        current_app.logger.error(f"获取编码统计时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'获取编码统计失败: {str(e)}'
+        }), 500
+
+@detection_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """获取检测结果缓存统计信息"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': detection_service.get_cache_stats()
+        })
+    except Exception as e:
+        current_app.logger.error(f"获取缓存统计时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'获取缓存统计失败: {str(e)}'
+        }), 500
+
+@detection_bp.route('/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """按模型指纹选择性清除检测结果缓存，未指定指纹时清除全部缓存"""
+    try:
+        data = request.get_json(silent=True) or {}
+        model_fingerprint = data.get('model_fingerprint')
+        removed = detection_service.invalidate_cache(model_fingerprint)
+        return jsonify({
+            'success': True,
+            'data': {
+                'model_fingerprint': model_fingerprint,
+                'removed': removed
+            }
+        })
+    except Exception as e:
+        current_app.logger.error(f"清除缓存时出错: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'清除缓存失败: {str(e)}'
+        }), 500
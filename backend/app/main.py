@@ -1,22 +1,27 @@
 from flask import Blueprint, render_template, request, jsonify, send_file, current_app
 from flask_cors import CORS
 import os
-from ultralytics import YOLO
-import cv2
-import numpy as np
-from PIL import Image
-import io
 import base64
 import logging
 import threading
 import time
-import requests
 import json
 from backend.app.services.detection import detection_service
-from backend.app.services.rules_checker import RulesChecker
+from backend.app.services.encoding import get_encoder
 
-# 初始化规则检查器
-rules_checker = RulesChecker()
+# 规则检查器在首次使用时创建，避免导入时加载 shapely
+_rules_checker = None
+_rules_checker_lock = threading.Lock()
+
+def get_rules_checker():
+    """获取规则检查器实例"""
+    global _rules_checker
+    if _rules_checker is None:
+        with _rules_checker_lock:
+            if _rules_checker is None:
+                from backend.app.services.rules_checker import RulesChecker
+                _rules_checker = RulesChecker()
+    return _rules_checker
 
 # 配置日志
 logging.basicConfig(
@@ -140,6 +145,7 @@ SILICONFLOW_API_URL = "https://api.siliconflow.com/v1/chat/completions"
 
 def analyze_image_with_siliconflow(image_base64):
     """使用硅基流动API分析图片"""
+    import requests
     try:
         headers = {
             "Authorization": f"Bearer {SILICONFLOW_API_KEY}",
@@ -201,6 +207,8 @@ def analyze_image_with_siliconflow(image_base64):
 
 def process_image_with_siliconflow(image_file):
     """处理图片并调用硅基流动API"""
+    import cv2
+    import numpy as np
     try:
         # 读取图片并转换为base64
         file_content = image_file.read()
@@ -239,7 +247,10 @@ def index():
 def get_model_status():
     """获取模型状态"""
     try:
-        return jsonify(detection_service.get_model_status())
+        return jsonify({
+            'success': True,
+            'status': detection_service.get_model_status()
+        })
     except Exception as e:
         logger.error(f"获取模型状态失败: {str(e)}")
         return jsonify({
@@ -251,6 +262,8 @@ def get_model_status():
 
 def process_image(image_file, model):
     """处理上传的图片并返回检测结果"""
+    import cv2
+    import numpy as np
     try:
         # 1. 读取文件内容
         file_content = image_file.read()
@@ -309,14 +322,16 @@ def process_image(image_file, model):
                     'bbox': [x1, y1, x2, y2]
                 })
             
-            # 6. 编码原图和检测后的图像
-            _, original_buffer = cv2.imencode('.png', original_img)
-            _, detected_buffer = cv2.imencode('.png', detected_img)
+            # 6. 编码原图和检测后的图像（格式和质量由配置决定）
+            encoder = get_encoder()
+            original_buffer = encoder.encode(original_img)
+            detected_buffer = encoder.encode(detected_img)
             
             # 7. 准备返回数据
             response_data = {
                 'original_image': base64.b64encode(original_buffer).decode(),
                 'detected_image': base64.b64encode(detected_buffer).decode(),
+                'image_format': encoder.mimetype,
                 'class_summary': [
                     {'class': class_name, 'count': count}
                     for class_name, count in class_counts.items()
@@ -342,6 +357,7 @@ def process_image(image_file, model):
 @main_bp.route('/api/network_check')
 def network_check():
     """网络诊断接口"""
+    import requests
     try:
         # 测试硅基流动API连接
         headers = {
@@ -393,6 +409,7 @@ def analyze():
 def load_model():
     """加载模型"""
     global model, model_loaded
+    from ultralytics import YOLO
     try:
         model_path = current_app.config['MODEL_PATH']
         if not os.path.exists(model_path):
@@ -423,7 +440,7 @@ def check_rules():
             }), 400
 
         # 执行规则检查
-        results = rules_checker.check_rules(data['detections'])
+        results = get_rules_checker().check_rules(data['detections'])
         
         return jsonify({
             'success': True,
@@ -438,6 +455,21 @@ def check_rules():
             'results': []
         }), 500
 
+@main_bp.route('/api/check-rules/stats', methods=['GET'])
+def get_rules_stats():
+    """获取规则检查的缓存命中率和各规则耗时"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': get_rules_checker().get_stats()
+        })
+    except Exception as e:
+        logger.error(f"获取规则检查统计失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'获取规则检查统计失败: {str(e)}'
+        }), 500
+
 if __name__ == '__main__':
     # 在后台线程中加载模型
     model_thread = threading.Thread(target=load_model)
@@ -0,0 +1,178 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """动态微批处理调度器
+
+    将并发提交的单个推理请求排队，凑满 max_batch_size 个或等待超过
+    max_wait_ms 毫秒后合并为一次批量推理，再把结果逐个返回给提交方。
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10, name='batcher', max_queue=0):
+        """
+        Args:
+            batch_fn: 批量处理函数，接收输入列表，返回等长的结果列表
+            max_batch_size: 单批最大样本数
+            max_wait_ms: 凑批的最长等待时间（毫秒）
+            name: 调度线程名称，便于日志定位
+            max_queue: 等待队列容量，队列满时 submit 阻塞；0 为不限
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.max_queue = max(0, int(max_queue))
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stopped = False
+
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            'batches': 0,
+            'items': 0,
+            'failed_batches': 0,
+            'batch_size_histogram': {},
+            'total_batch_latency': 0.0,
+            'max_batch_latency': 0.0,
+            'last_batch_latency': 0.0,
+            'total_queue_wait': 0.0,
+            'max_queue_wait': 0.0
+        }
+
+    def _ensure_worker(self):
+        """按需启动调度线程"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped = False
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def submit(self, item):
+        """提交单个输入，返回 concurrent.futures.Future"""
+        if self._stopped:
+            raise RuntimeError(f"批处理调度器 {self.name} 已停止")
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        self._ensure_worker()
+        return future
+
+    def __call__(self, item, timeout=None):
+        """同步提交并等待结果"""
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """阻塞等待第一个请求，然后在时间窗口内尽量凑满一批"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    entry = self._queue.get_nowait()
+                else:
+                    entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # 停止信号放回队列，处理完当前批次后退出
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            items = [entry[0] for entry in batch]
+            futures = [entry[1] for entry in batch]
+            start = time.perf_counter()
+            queue_waits = [start - entry[2] for entry in batch]
+
+            error = None
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"批处理结果数量不匹配: 输入 {len(items)} 个, 输出 {len(results)} 个")
+            except Exception as e:
+                error = e
+                logger.error(f"批处理推理失败: {str(e)}")
+
+            # 先记录耗时再设置结果：结果回调可能把输出提交给下游并因背压阻塞
+            self._record_batch(len(items), time.perf_counter() - start, queue_waits, error is not None)
+            if error is not None:
+                for future in futures:
+                    future.set_exception(error)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+
+    def _record_batch(self, size, latency, queue_waits, failed):
+        with self._stats_lock:
+            stats = self._stats
+            stats['batches'] += 1
+            stats['items'] += size
+            if failed:
+                stats['failed_batches'] += 1
+            stats['batch_size_histogram'][size] = stats['batch_size_histogram'].get(size, 0) + 1
+            stats['total_batch_latency'] += latency
+            stats['max_batch_latency'] = max(stats['max_batch_latency'], latency)
+            stats['last_batch_latency'] = latency
+            stats['total_queue_wait'] += sum(queue_waits)
+            stats['max_queue_wait'] = max([stats['max_queue_wait']] + queue_waits)
+
+    def get_stats(self):
+        """返回批处理延迟与占用率统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            histogram = dict(sorted(stats.pop('batch_size_histogram').items()))
+
+        batches = stats['batches']
+        items = stats['items']
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'max_queue': self.max_queue,
+            'batches': batches,
+            'items': items,
+            'failed_batches': stats['failed_batches'],
+            'avg_batch_size': items / batches if batches else 0.0,
+            'avg_occupancy': items / (batches * self.max_batch_size) if batches else 0.0,
+            'batch_size_histogram': {str(k): v for k, v in histogram.items()},
+            'avg_batch_latency_ms': stats['total_batch_latency'] / batches * 1000.0 if batches else 0.0,
+            'max_batch_latency_ms': stats['max_batch_latency'] * 1000.0,
+            'last_batch_latency_ms': stats['last_batch_latency'] * 1000.0,
+            'avg_queue_wait_ms': stats['total_queue_wait'] / items * 1000.0 if items else 0.0,
+            'max_queue_wait_ms': stats['max_queue_wait'] * 1000.0
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
+
+    def shutdown(self, wait=True):
+        """停止调度线程，已排队的请求会先处理完"""
+        self._stopped = True
+        self._queue.put(None)
+        if wait and self._worker is not None:
+            self._worker.join()
@@ -0,0 +1,149 @@
+import numpy as np
+
+
+def result_to_arrays(result):
+    """将 ultralytics 单张图像的结果一次性转换为NumPy数组
+    Returns:
+        (xyxy (N,4) float32, conf (N,) float32, cls (N,) int64)
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return (np.zeros((0, 4), dtype=np.float32),
+                np.zeros((0,), dtype=np.float32),
+                np.zeros((0,), dtype=np.int64))
+    data = boxes.data
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    return (data[:, :4].astype(np.float32),
+            data[:, -2].astype(np.float32),
+            data[:, -1].astype(np.int64))
+
+
+def box_area(boxes):
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def pairwise_iou(boxes_a, boxes_b, metric='iou'):
+    """计算两组框的重叠矩阵 (N, M)
+    Args:
+        metric: 'iou' 为交并比；'ios' 为交集占较小框面积的比例，
+            适合合并被切片边界截断的框
+    """
+    lt = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    rb = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    area_a = box_area(boxes_a)[:, None]
+    area_b = box_area(boxes_b)[None, :]
+    if metric == 'ios':
+        denom = np.minimum(area_a, area_b)
+    else:
+        denom = area_a + area_b - inter
+    return np.where(denom > 0, inter / np.maximum(denom, 1e-9), 0.0)
+
+
+def _nms_single(boxes, scores, iou_threshold, metric):
+    order = np.argsort(-scores, kind='stable')
+    overlap = pairwise_iou(boxes[order], boxes[order], metric)
+    # 只看分数更高的框：上三角中超过阈值的即被抑制候选
+    suppress = np.triu(overlap > iou_threshold, k=1)
+    keep = np.ones(len(order), dtype=bool)
+    for i in range(len(order)):
+        if keep[i]:
+            keep &= ~suppress[i]
+    return order[keep]
+
+
+def nms(boxes, scores, iou_threshold=0.5, class_ids=None, metric='iou'):
+    """向量化的非极大值抑制，按类别分别抑制
+    Args:
+        boxes: (N, 4) xyxy
+        scores: (N,)
+        iou_threshold: 重叠阈值
+        class_ids: 可选的 (N,) 类别编号，提供时只在同类之间抑制
+        metric: 重叠度量，'iou' 或 'ios'
+    Returns:
+        保留框的下标数组，按分数降序
+    """
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    boxes = np.asarray(boxes, dtype=np.float32)
+    scores = np.asarray(scores, dtype=np.float32)
+    if class_ids is None:
+        return _nms_single(boxes, scores, iou_threshold, metric)
+
+    # 逐类别计算，重叠矩阵只需 O(每类框数^2) 的内存
+    class_ids = np.asarray(class_ids)
+    keep = []
+    for class_id in np.unique(class_ids):
+        index = np.nonzero(class_ids == class_id)[0]
+        keep.append(index[_nms_single(boxes[index], scores[index], iou_threshold, metric)])
+    keep = np.concatenate(keep)
+    return keep[np.argsort(-scores[keep], kind='stable')]
+
+
+def expand_boxes(boxes, ratio, width, height):
+    """按边长比例向四周扩展框，并裁剪到图像范围"""
+    boxes = np.asarray(boxes, dtype=np.float32)
+    if len(boxes) == 0:
+        return boxes.reshape(0, 4)
+    pad_w = (boxes[:, 2] - boxes[:, 0]) * ratio
+    pad_h = (boxes[:, 3] - boxes[:, 1]) * ratio
+    expanded = np.stack([
+        boxes[:, 0] - pad_w,
+        boxes[:, 1] - pad_h,
+        boxes[:, 2] + pad_w,
+        boxes[:, 3] + pad_h
+    ], axis=1)
+    expanded[:, [0, 2]] = np.clip(expanded[:, [0, 2]], 0, width)
+    expanded[:, [1, 3]] = np.clip(expanded[:, [1, 3]], 0, height)
+    return expanded
+
+
+def merge_overlapping(boxes):
+    """将相互重叠的框合并为外接框，直到没有重叠为止"""
+    boxes = [list(map(float, b)) for b in boxes]
+    merged = True
+    while merged and len(boxes) > 1:
+        merged = False
+        arr = np.asarray(boxes, dtype=np.float32)
+        overlap = ((arr[:, None, 0] < arr[None, :, 2]) & (arr[None, :, 0] < arr[:, None, 2]) &
+                   (arr[:, None, 1] < arr[None, :, 3]) & (arr[None, :, 1] < arr[:, None, 3]))
+        np.fill_diagonal(overlap, False)
+        pairs = np.argwhere(overlap)
+        if len(pairs):
+            i, j = pairs[0]
+            union = [min(boxes[i][0], boxes[j][0]), min(boxes[i][1], boxes[j][1]),
+                     max(boxes[i][2], boxes[j][2]), max(boxes[i][3], boxes[j][3])]
+            boxes = [b for k, b in enumerate(boxes) if k not in (i, j)] + [union]
+            merged = True
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def box_centers(boxes):
+    """(N,4) 框的中心点 (N,2)"""
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+
+def box_corners(boxes):
+    """(N,4) 框的四个角点 (N,4,2)，顺序为左上、右上、右下、左下"""
+    return np.stack([boxes[:, [0, 1]], boxes[:, [2, 1]], boxes[:, [2, 3]], boxes[:, [0, 3]]], axis=1)
+
+
+def pairwise_distances(points_a, points_b):
+    """两组点 (..., 2) 之间的欧氏距离，按广播规则一次计算"""
+    diff = points_a - points_b
+    return np.sqrt(diff[..., 0] ** 2 + diff[..., 1] ** 2)
+
+
+def points_in_circles(points, centers, radii):
+    """批量判断点是否落在圆内（含圆周）
+    Args:
+        points: (P, K, 2) 每组 K 个点，如 P 个框的四个角点
+        centers: (C, 2) 圆心
+        radii: (C,) 半径
+    Returns:
+        (P, C, K) 布尔数组
+    """
+    distances = pairwise_distances(points[:, None, :, :], centers[None, :, None, :])
+    return distances <= radii[None, :, None]
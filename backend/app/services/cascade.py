@@ -0,0 +1,122 @@
+import hashlib
+import logging
+
+import cv2
+import numpy as np
+
+from backend.app.services.box_ops import result_to_arrays, nms, expand_boxes, merge_overlapping
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeDetector:
+    """两阶段级联检测
+
+    第一阶段用通用模型在缩小后的图纸上低阈值检测，得到候选区域；
+    第二阶段只把候选区域对应的原图裁剪块送入专用模型（如塔吊模型），
+    最后把裁剪块内的检测框映射回原图坐标并做跨区域NMS合并。
+    大面积空白的总平面图只需一次小图推理加少量裁剪块推理。
+    """
+
+    def __init__(self, proposal_model, specialists=None, default_specialist=None,
+                 proposal_max_side=640, proposal_conf=0.1, conf=0.25, imgsz=640,
+                 margin=0.2, iou_threshold=0.5, max_regions=32):
+        """
+        Args:
+            proposal_model: 第一阶段通用模型
+            specialists: {候选类别名称: 专用模型}，该类别的候选区域交给对应专用模型
+            default_specialist: 其他候选区域使用的模型，为空时使用第一阶段模型
+            proposal_max_side: 第一阶段缩小后图像的最长边（同时作为第一阶段推理尺寸）
+            proposal_conf: 第一阶段置信度阈值（偏低以保证召回）
+            conf: 第二阶段置信度阈值
+            imgsz: 第二阶段推理输入尺寸
+            margin: 候选框向外扩展的比例
+            iou_threshold: 合并结果时的NMS阈值
+            max_regions: 每个模型最多处理的裁剪块数量
+        """
+        self.proposal_model = proposal_model
+        self.specialists = dict(specialists or {})
+        self.default_specialist = default_specialist or proposal_model
+        self.proposal_max_side = proposal_max_side
+        self.proposal_conf = proposal_conf
+        self.conf = conf
+        self.imgsz = imgsz
+        self.margin = margin
+        self.iou_threshold = iou_threshold
+        self.max_regions = max_regions
+
+    @staticmethod
+    def fingerprint(model_fingerprints):
+        """由各阶段模型指纹组合出级联模式的指纹"""
+        source = 'cascade:' + ','.join(model_fingerprints)
+        return hashlib.md5(source.encode('utf-8')).hexdigest()
+
+    def _propose(self, img):
+        """在缩小的图像上检测候选区域，返回原图坐标下的候选框和类别名称"""
+        height, width = img.shape[:2]
+        scale = min(1.0, self.proposal_max_side / float(max(height, width)))
+        small = img if scale >= 1.0 else cv2.resize(
+            img, (int(round(width * scale)), int(round(height * scale))), interpolation=cv2.INTER_AREA)
+
+        result = self.proposal_model.predict(small, conf=self.proposal_conf, imgsz=self.proposal_max_side)[0]
+        xyxy, _, cls = result_to_arrays(result)
+        names = [result.names[int(c)] for c in cls]
+        return xyxy / scale, names
+
+    def _route(self, boxes, names, width, height):
+        """按候选类别把区域分配给专用模型，并合并重叠区域"""
+        routed = {}
+        for box, name in zip(boxes, names):
+            model = self.specialists.get(name, self.default_specialist)
+            routed.setdefault(id(model), (model, []))[1].append(box)
+
+        regions = []
+        for model, model_boxes in routed.values():
+            expanded = expand_boxes(np.asarray(model_boxes), self.margin, width, height)
+            merged = merge_overlapping(expanded)
+            if len(merged) > self.max_regions:
+                # 区域过多时保留面积最大的部分
+                areas = (merged[:, 2] - merged[:, 0]) * (merged[:, 3] - merged[:, 1])
+                merged = merged[np.argsort(-areas)[:self.max_regions]]
+            regions.append((model, merged.astype(np.int64)))
+        return regions
+
+    def detect(self, img):
+        """执行级联检测
+        Returns:
+            (xyxy (N,4), conf (N,), class_names 列表)，坐标为原图坐标
+        """
+        height, width = img.shape[:2]
+        proposals, names = self._propose(img)
+        if len(proposals) == 0:
+            return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.float32), []
+
+        all_boxes, all_scores, all_names = [], [], []
+        region_count = 0
+        for model, regions in self._route(proposals, names, width, height):
+            regions = [r for r in regions if r[2] > r[0] and r[3] > r[1]]
+            if not regions:
+                continue
+            region_count += len(regions)
+            crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+            offsets = [(x1, y1) for x1, y1, _, _ in regions]
+            # 同一模型的所有裁剪块一次批量推理
+            results = model.predict(crops, conf=self.conf, imgsz=self.imgsz)
+            for (ox, oy), result in zip(offsets, results):
+                xyxy, conf, cls = result_to_arrays(result)
+                if len(xyxy) == 0:
+                    continue
+                all_boxes.append(xyxy + np.array([ox, oy, ox, oy], dtype=np.float32))
+                all_scores.append(conf)
+                all_names.extend(result.names[int(c)] for c in cls)
+
+        if not all_boxes:
+            return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.float32), []
+
+        boxes = np.concatenate(all_boxes)
+        scores = np.concatenate(all_scores)
+        class_index = {name: i for i, name in enumerate(dict.fromkeys(all_names))}
+        class_ids = np.array([class_index[name] for name in all_names])
+        keep = nms(boxes, scores, self.iou_threshold, class_ids)
+        logger.info(f"级联检测: {len(proposals)} 个候选, {region_count} 个区域, 保留 {len(keep)} 个目标")
+        return boxes[keep], scores[keep], [all_names[i] for i in keep]
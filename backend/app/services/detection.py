@@ -1,40 +1,99 @@
 import os
 import cv2
 import numpy as np
-import torch
 import logging
 from threading import Lock
 from datetime import datetime
 import glob
 import base64
 import json
+import time
+import re
 import hashlib
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from backend.config.config import Config
+from backend.app.services.batching import MicroBatcher
+from backend.app.services.pipeline import Pipeline, StagePool, Completed
+from backend.app.services.label_renderer import LabelRenderer
+from backend.app.services.result_cache import ResultCache
+from backend.app.services.ingest import ImageBuffer, read_image_bytes, read_image_file
+from backend.app.services.model_registry import ModelRegistry
+from backend.app.services.box_ops import result_to_arrays
+from backend.app.services.cascade import CascadeDetector
+from backend.app.services.tiling import TiledDetector
+from backend.app.services.jobs import JobManager
+from backend.app.services.postprocess import DetectionPostprocessor
+from backend.app.services.encoding import get_encoder, get_encoder_stats
+from backend.app.services.inference_backends import create_loader
+
+# 渲染令牌即检测结果的缓存键（MD5十六进制）
+RENDER_TOKEN_PATTERN = re.compile(r'^[0-9a-f]{32}$')
 
 class DetectionService:
     _instance = None
     _lock = Lock()
+    DETECTION_MODES = ('single', 'cascade', 'tiled')
+    # 标注使用的高饱和度颜色
+    HIGH_SATURATION_COLORS = {
+        '起重机': (255, 0, 0),     # 红色
+        '塔吊': (0, 255, 0),      # 绿色
+        '挖掘机': (255, 128, 0),   # 橙色
+        '大门': (255, 0, 255),     # 洋红
+        '搅拌机': (0, 255, 255),   # 青色
+        '办公室': (255, 255, 0),   # 黄色
+        '红线': (255, 0, 0),      # 红色
+        '道路': (128, 0, 255),    # 紫色
+        '楼梯': (0, 128, 255),    # 蓝色
+        '钢筋加工厂': (255, 64, 0), # 橙红色
+        '宿舍': (0, 255, 128),    # 青绿色
+        '厕所': (128, 255, 0)     # 黄绿色
+    }
+    DEFAULT_COLOR = (0, 0, 255)
     
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
                     cls._instance = super(DetectionService, cls).__new__(cls)
-                    cls._instance.model = None
-                    cls._instance.current_model_path = None
-                    cls._instance.available_models = {}
+                    cls._instance._active_model = None
+                    cls._instance._warmup = {'state': 'pending', 'timings': [], 'error': None,
+                                             'started_at': None, 'finished_at': None}
         return cls._instance
     
     def __init__(self):
         if not hasattr(self, 'initialized'):
             self.initialized = True
             self.logger = logging.getLogger(__name__)
-            self.model = None
-            # 创建缓存目录
-            self.cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'cache')
-            if not os.path.exists(self.cache_dir):
-                os.makedirs(self.cache_dir)
-            # 直接加载默认模型
-            self.load_model()
+            # 推理参数
+            self.conf = Config.DETECTION_CONF
+            self.imgsz = Config.DETECTION_IMGSZ
+            # 模型注册表：扫描模型目录，按LRU常驻多个模型
+            # 推理后端可选 torch / onnxruntime / openvino，非torch后端加载时自动导出并缓存
+            self.backend = Config.INFERENCE_BACKEND
+            # 默认模型的加载时机，由 create_app 按实际参数设置
+            self.preload_mode = Config.MODEL_PRELOAD
+            # 只有模型目录中的权重和配置中的默认模型可以被加载
+            self.model_registry = ModelRegistry(
+                Config.MODEL_DIR,
+                max_resident=Config.MODEL_MAX_RESIDENT,
+                loader=create_loader(
+                    self.backend,
+                    imgsz=Config.DETECTION_IMGSZ,
+                    intra_op_threads=Config.INFERENCE_INTRA_OP_THREADS,
+                    inter_op_threads=Config.INFERENCE_INTER_OP_THREADS
+                ),
+                extra_paths={ModelRegistry.model_name(path): path
+                             for path in (Config.MODEL_PATH, Config.CASCADE_PROPOSAL_MODEL_PATH)}
+            )
+            # 检测结果缓存（分片目录 + 内存索引 + 字节预算淘汰），首次使用时才扫描缓存目录
+            self.cache_dir = Config.CACHE_DIR
+            self._result_cache = None
+            self._result_cache_lock = Lock()
+            # 工作进程总数，由 gunicorn 在 fork 后通过 after_fork 设置
+            self.server_workers = 1
+            # 微批处理调度器和异步任务线程池
+            self._create_executors()
+            # 模型不在构造时加载：首次使用时按需加载，或由 create_app / warmup 显式加载
             
             # 类别映射
             self.CATEGORY_MAPPING = {
@@ -63,6 +122,10 @@ class DetectionService:
                 '道路': {'name': '道路', 'category': '基础设施', 'color': '#36CFC9'}
             }
 
+            # 按模型类别表预计算查找表的向量化后处理
+            self.postprocessor = DetectionPostprocessor(
+                self.CATEGORY_MAPPING, self.HIGH_SATURATION_COLORS, self.DEFAULT_COLOR)
+
             # 类别颜色映射 (BGR格式)
             self.CATEGORY_COLORS = {
                 '起重机': (255, 0, 0),      # 蓝色
@@ -84,227 +147,745 @@ class DetectionService:
             self.font_path = '/home/bailey/Code/yyh/yolov11/backend/fonts/simsun(1).ttc'
             if not os.path.exists(self.font_path):
                 self.logger.warning(f"中文字体文件不存在: {self.font_path}")
-            
-            # 扫描可用模型
-            self.available_models = {}
+            self.label_renderer = LabelRenderer(self.font_path)
     
+    @property
+    def result_cache(self):
+        """检测结果缓存，首次访问时创建缓存目录并重建索引
+
+        导入模块和创建应用时不触碰缓存目录，gunicorn 主进程也不会预先扫描，
+        由各工作进程在首次使用时各自加载。
+        """
+        cache = self._result_cache
+        if cache is None:
+            with self._result_cache_lock:
+                if self._result_cache is None:
+                    self._result_cache = ResultCache(
+                        self.cache_dir,
+                        max_bytes=Config.CACHE_MAX_BYTES,
+                        policy=Config.CACHE_POLICY
+                    )
+                cache = self._result_cache
+        return cache
+
     def _get_image_hash(self, image_path):
         """计算图片的MD5哈希值作为缓存键"""
-        with open(image_path, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
-
-    def _get_cache_path(self, image_hash):
-        """获取缓存文件路径"""
-        return os.path.join(self.cache_dir, f"{image_hash}.json")
-
-    def _save_to_cache(self, image_hash, result):
-        """保存检测结果到缓存"""
-        cache_path = self._get_cache_path(image_hash)
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-
-    def _load_from_cache(self, image_hash):
-        """从缓存加载检测结果"""
-        cache_path = self._get_cache_path(image_hash)
-        if os.path.exists(cache_path):
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        with read_image_file(image_path) as image_buffer:
+            return image_buffer.md5
+
+    def _open_image_source(self, image, image_hash=None):
+        """将路径/字节/缓冲区统一为 ImageBuffer，哈希与解码共用同一次读取"""
+        if isinstance(image, ImageBuffer):
+            return image
+        if isinstance(image, (str, os.PathLike)):
+            return read_image_file(image)
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            if image_hash is not None:
+                return ImageBuffer(image, image_hash)
+            return read_image_bytes(image)
+        raise TypeError(f"不支持的图像输入类型: {type(image).__name__}")
+
+    @staticmethod
+    def _decode_image(image_buffer):
+        """直接从内存缓冲区解码图像"""
+        img = cv2.imdecode(np.frombuffer(image_buffer.data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise Exception("无法读取图像")
+        return img
+
+    def _get_cache_key(self, image_hash, model_fingerprint, params=None):
+        """缓存键 = 图片哈希 + 模型权重指纹 + 推理参数
+        Args:
+            params: 检测模式相关的额外参数（如切片尺寸），会一并参与哈希
+        """
+        key_data = {
+            'image': image_hash,
+            'model': model_fingerprint,
+            'conf': self.conf,
+            'imgsz': self.imgsz
+        }
+        if params:
+            key_data['params'] = params
+        if self.backend != 'torch':
+            # 不同推理后端的数值结果存在细微差异，分开缓存
+            key_data['backend'] = self.backend
+        key_source = json.dumps(key_data, sort_keys=True)
+        return hashlib.md5(key_source.encode('utf-8')).hexdigest()
+
+    def _save_to_cache(self, cache_key, result, image_bytes=None, model_fingerprint=None, image_hash=None):
+        """保存检测结果到缓存，标注图像以二进制形式单独存储
+        Args:
+            image_hash: 原图MD5，按需渲染标注图像时据此找到缓存的原图
+        """
+        data = {k: v for k, v in result['data'].items() if k not in ('detected_image', 'render_token')}
+        meta = {'success': result['success'], 'data': data, 'image': image_hash}
+        # 以模型指纹作为标签，便于按模型版本选择性失效
+        self.result_cache.put(cache_key, meta, image_bytes, tag=model_fingerprint)
+
+    def _load_from_cache(self, cache_key, render=True):
+        """从缓存加载检测结果
+        Args:
+            render: 是否需要标注图像，缓存中没有时按需渲染
+        """
+        entry = self.result_cache.get(cache_key)
+        if entry is None:
+            return None
+        meta, image_bytes = entry
+        data = dict(meta['data'])
+        data['render_token'] = cache_key
+        if render and not image_bytes:
+            try:
+                image_bytes, data['detected_image_format'] = self.render_image(cache_key)
+            except KeyError:
+                # 原图已被淘汰，按未命中处理重新检测
+                return None
+        data['detected_image'] = base64.b64encode(image_bytes).decode('utf-8') if render and image_bytes else None
+        return {'success': meta['success'], 'data': data}
+
+    @staticmethod
+    def _get_source_key(image_hash):
+        """原图在结果缓存中的键"""
+        return hashlib.md5(f"source:{image_hash}".encode('utf-8')).hexdigest()
+
+    def _save_source(self, image_buffer):
+        """缓存原图字节，供按需渲染标注图像使用"""
+        source_key = self._get_source_key(image_buffer.md5)
+        if source_key not in self.result_cache:
+            self.result_cache.put(source_key, {'image': image_buffer.md5}, image_buffer.data, tag='source')
+
+    def _draw_detections(self, img, detections):
+        """在图像上原地绘制检测框和中文标签"""
+        for detection in detections:
+            x1, y1, x2, y2 = detection['bbox']
+            color = tuple(detection['color'])
+            # 在图像上绘制边界框，增加线条粗细
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, 4)
+            # 调整标签位置到框的上方，减小标签和框的间距
+            label_y = max(y1 - 5, 0)
+            self.draw_chinese_text(img, detection['class'], (x1, label_y), color, x2 - x1)
+        return img
+
+    @staticmethod
+    def is_render_token(render_token):
+        """是否为合法的渲染令牌（32位小写十六进制MD5），客户端提供的令牌须先校验再作为缓存键"""
+        return isinstance(render_token, str) and RENDER_TOKEN_PATTERN.match(render_token) is not None
+
+    def render_image(self, render_token, fmt=None, quality=None, scale=1.0, max_side=None, annotate=True):
+        """按需渲染标注图像，渲染结果按参数缓存
+        Args:
+            render_token: 检测结果中的 render_token
+            fmt: 输出格式 png / jpeg / webp，默认取 Config.IMAGE_FORMAT
+            quality: PNG 压缩级别 (0-9) 或 JPEG/WebP 质量 (1-100)，为空时使用配置值
+            scale: 输出缩放比例 (0, 1]
+            max_side: 可选的输出最长边，与 scale 同时给出时取较小的缩放
+            annotate: 是否绘制检测框和标签，为False时只输出缩放后的原图（用作预览缩略图）
+        Returns:
+            (图像字节, MIME类型)
+        Raises:
+            KeyError: 令牌不合法，或检测结果、原图已不在缓存中
+            ValueError: 参数不合法
+        """
+        if not self.is_render_token(render_token):
+            raise KeyError(f"检测结果 {render_token} 不存在或已过期")
+        encoder = get_encoder(fmt, quality)
+        fmt, quality, mimetype = encoder.format, encoder.quality, encoder.mimetype
+        if not 0 < scale <= 1:
+            raise ValueError("缩放比例必须在 (0, 1] 范围内")
+        
+        render_key = hashlib.md5(json.dumps(
+            {'token': render_token, 'format': fmt, 'quality': quality, 'scale': scale,
+             'max_side': max_side, 'annotate': annotate},
+            sort_keys=True).encode('utf-8')).hexdigest()
+        cached = self.result_cache.get(render_key)
+        if cached is not None and cached[1]:
+            return cached[1], mimetype
+        
+        entry = self.result_cache.get(render_token)
+        if entry is None:
+            raise KeyError(f"检测结果 {render_token} 不存在或已过期")
+        meta = entry[0]
+        source = self.result_cache.get(self._get_source_key(meta.get('image')))
+        if source is None or not source[1]:
+            raise KeyError(f"检测结果 {render_token} 的原图不存在或已过期")
+        
+        img = self._decode_image(ImageBuffer(source[1], meta.get('image')))
+        detections = meta['data']['detections']
+        if max_side:
+            scale = min(scale, float(max_side) / max(img.shape[:2]))
+        if scale < 1:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            detections = [dict(d, bbox=[int(v * scale) for v in d['bbox']]) for d in detections]
+        if annotate:
+            self._draw_detections(img, detections)
+        image_bytes = encoder.encode(img)
+        
+        # 渲染结果与检测结果使用同一模型指纹标签，模型失效时一并清除
+        self.result_cache.put(render_key, {'token': render_token, 'format': fmt},
+                              image_bytes, tag=self.result_cache.get_tag(render_token))
+        return image_bytes, mimetype
+
+    def get_cache_stats(self):
+        """获取结果缓存的命中、未命中与淘汰统计"""
+        stats = self.result_cache.get_stats()
+        stats['current_model_fingerprint'] = self.model_fingerprint
+        stats['models'] = self.result_cache.get_tag_stats()
+        return stats
+
+    def invalidate_cache(self, model_fingerprint=None):
+        """按模型指纹选择性清除缓存
+        Args:
+            model_fingerprint: 要清除的模型指纹，为空时清除全部缓存
+        Returns:
+            被清除的条目数
+        """
+        if model_fingerprint is None:
+            return self.result_cache.clear()
+        return self.result_cache.invalidate(model_fingerprint)
+
+    @property
+    def model(self):
+        """当前激活的模型对象"""
+        active = self._active_model
+        return active.model if active is not None else None
+
+    @property
+    def current_model_path(self):
+        active = self._active_model
+        return active.path if active is not None else None
+
+    @property
+    def model_fingerprint(self):
+        active = self._active_model
+        return active.fingerprint if active is not None else None
 
     def load_model(self, model_name=None):
-        """加载模型
+        """加载模型并设为当前模型
         Args:
-            model_name: 可选的模型名称，如果不指定则使用默认模型
+            model_name: 可选的模型名称或权重路径，如果不指定则使用默认模型
         """
         try:
-            # 直接使用best.pt作为默认模型
-            model_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'models', 'best.pt')
-            
-            if not os.path.exists(model_path):
-                self.logger.error(f"模型文件不存在: {model_path}")
-                return False
-                
-            self.logger.info(f"正在加载模型: {model_path}")
-            
-            # 使用YOLO类直接加载模型
-            from ultralytics import YOLO
-            self.model = YOLO(model_path)
-            self.current_model_path = model_path
-            self.logger.info("模型加载成功")
-            return True
-            
+            entry = self.model_registry.get(model_name or Config.MODEL_PATH)
+        except KeyError as e:
+            self.logger.error(f"模型文件不存在: {str(e)}")
+            return False
         except Exception as e:
             self.logger.error(f"加载模型失败: {str(e)}")
             return False
+        
+        # 单次引用赋值完成切换，正在处理的请求继续使用各自持有的模型
+        self._active_model = entry
+        # 当前模型固定常驻，避免被按请求指定的模型挤出后内存统计遗漏
+        self.model_registry.pin(entry.name)
+        self.logger.info(f"模型加载成功: {entry.name}")
+        return True
+
+    def switch_model(self, model_name):
+        """切换当前模型
+        Args:
+            model_name: 模型名称或权重路径
+        """
+        previous = self._active_model
+        if not self.load_model(model_name):
+            return False
+        if previous is not None and previous.name != self._active_model.name:
+            self.logger.info(f"模型已从 {previous.name} 切换到 {self._active_model.name}")
+        return True
+
+    def _get_model_entry(self, model_path=None):
+        """获取本次请求使用的模型，未指定时使用当前模型"""
+        if model_path:
+            return self.model_registry.get(model_path)
+        active = self._active_model
+        if active is None:
+            if not self.load_model():
+                raise Exception("无法加载模型")
+            active = self._active_model
+        return active
+
+    def has_model(self, model_name):
+        """模型名称是否已注册（模型目录中的权重或默认模型）"""
+        return self.model_registry.is_registered(model_name)
+
+    def _get_cascade_detector(self):
+        """构建级联检测器，返回 (检测器, 组合指纹)
+
+        第一阶段使用通用模型，塔吊候选交给塔吊专用模型，其余候选交给
+        其他类别模型；专用模型权重不存在时退回第一阶段模型。
+        """
+        proposal = self.model_registry.get(Config.CASCADE_PROPOSAL_MODEL_PATH)
+        entries = [proposal]
+        specialists = {}
+        if os.path.exists(Config.TOWER_CRANE_MODEL_PATH):
+            tower_crane = self.model_registry.get(Config.TOWER_CRANE_MODEL_PATH)
+            specialists['塔吊'] = tower_crane.model
+            entries.append(tower_crane)
+        default_specialist = None
+        if os.path.exists(Config.OTHER_MODEL_PATH):
+            other = self.model_registry.get(Config.OTHER_MODEL_PATH)
+            default_specialist = other.model
+            entries.append(other)
+        
+        cascade = CascadeDetector(
+            proposal.model,
+            specialists=specialists,
+            default_specialist=default_specialist,
+            proposal_max_side=Config.CASCADE_PROPOSAL_MAX_SIDE,
+            proposal_conf=Config.CASCADE_PROPOSAL_CONF,
+            conf=self.conf,
+            imgsz=self.imgsz,
+            margin=Config.CASCADE_REGION_MARGIN
+        )
+        fingerprint = CascadeDetector.fingerprint([entry.fingerprint for entry in entries])
+        return cascade, fingerprint
+
+    def _get_tiled_detector(self, model_entry):
+        """构建切片检测器"""
+        return TiledDetector(
+            model_entry.model,
+            tile_size=Config.TILE_SIZE,
+            overlap=Config.TILE_OVERLAP,
+            batch_size=Config.TILE_BATCH_SIZE,
+            conf=self.conf,
+            iou_threshold=Config.TILE_NMS_THRESHOLD
+        )
+
+    def get_model_status(self):
+        """获取模型状态，包括可用模型与常驻模型的加载耗时和内存占用"""
+        active = self._active_model
+        status = {
+            'loaded': active is not None,
+            'backend': self.backend,
+            'current_model': active.name if active is not None else None,
+            'current_model_path': active.path if active is not None else None,
+            'current_model_info': active.to_dict() if active is not None else None,
+            'available_models': self.model_registry.get_available_models()
+        }
+        status.update(self.model_registry.get_status())
+        return status
+    
+    def _get_warmup_plan(self):
+        """返回预热使用的 (推理尺寸列表, 批大小列表)"""
+        if Config.WARMUP_SIZES:
+            sizes = [int(v) for v in Config.WARMUP_SIZES.split(',') if v.strip()]
+        else:
+            sizes = [self.imgsz]
+            if Config.DETECTION_MODE == 'tiled':
+                sizes.append(Config.TILE_SIZE)
+            elif Config.DETECTION_MODE == 'cascade':
+                sizes.append(Config.CASCADE_PROPOSAL_MAX_SIDE)
+        if Config.WARMUP_BATCH_SIZES:
+            batch_sizes = [int(v) for v in Config.WARMUP_BATCH_SIZES.split(',') if v.strip()]
+        else:
+            batch_sizes = [1, Config.BATCH_MAX_SIZE]
+        return list(dict.fromkeys(sizes)), sorted(set(batch_sizes))
+    
+    def warmup(self, iterations=None):
+        """预热：用合成图像执行推理、标签渲染和图像编码
+        
+        首个真实请求不再承担内核选择、ultralytics 延迟初始化和内存分配器增长的开销。
+        Args:
+            iterations: 每个尺寸/批大小组合的推理次数，默认取 Config.WARMUP_ITERATIONS
+        Returns:
+            是否预热成功
+        """
+        iterations = Config.WARMUP_ITERATIONS if iterations is None else iterations
+        self._warmup = {'state': 'running', 'timings': [], 'error': None,
+                        'started_at': time.time(), 'finished_at': None}
+        timings = self._warmup['timings']
+        try:
+            model_entry = self._get_model_entry()
+            sizes, batch_sizes = self._get_warmup_plan()
+            rng = np.random.default_rng(0)
+            for size in sizes:
+                img = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+                for batch_size in batch_sizes:
+                    for iteration in range(iterations):
+                        start = time.perf_counter()
+                        # 经由推理调度器执行：模型的 predictor 不是线程安全的，
+                        # 后台预热期间可能已有请求在推理线程中使用同一模型
+                        ctx = {'mode': 'warmup', 'model_entry': model_entry, 'imgs': [img] * batch_size,
+                               'imgsz': size, 'progress': lambda stage, fraction: None}
+                        self.batcher(ctx)
+                        if 'error' in ctx:
+                            raise ctx['error']
+                        timings.append({'stage': 'inference', 'imgsz': size, 'batch_size': batch_size,
+                                        'iteration': iteration,
+                                        'ms': (time.perf_counter() - start) * 1000.0})
+            
+            # 预热标签渲染（加载字体）和默认编码器
+            canvas = np.full((self.imgsz, self.imgsz, 3), 255, dtype=np.uint8)
+            start = time.perf_counter()
+            self._draw_detections(canvas, [{'bbox': [10, 40, self.imgsz // 2, self.imgsz // 2],
+                                            'class': '塔吊', 'color': self.DEFAULT_COLOR}])
+            get_encoder().encode(canvas)
+            timings.append({'stage': 'render', 'imgsz': self.imgsz, 'batch_size': 1, 'iteration': 0,
+                            'ms': (time.perf_counter() - start) * 1000.0})
+            self._warmup['state'] = 'done'
+        except Exception as e:
+            self.logger.error(f"模型预热失败: {str(e)}", exc_info=True)
+            self._warmup['state'] = 'failed'
+            self._warmup['error'] = str(e)
+        self._warmup['finished_at'] = time.time()
+        total = sum(t['ms'] for t in timings)
+        self.logger.info(f"模型预热{'完成' if self._warmup['state'] == 'done' else '失败'}: "
+                         f"{len(timings)} 次, 共 {total:.0f} ms")
+        return self._warmup['state'] == 'done'
+    
+    def get_warmup_status(self):
+        """获取预热状态和预热期间测得的耗时"""
+        status = dict(self._warmup)
+        status['timings'] = list(status['timings'])
+        if status['started_at'] and status['finished_at']:
+            status['duration_ms'] = (status['finished_at'] - status['started_at']) * 1000.0
+        # 每个组合的首次与稳定耗时，首次耗时中包含初始化开销
+        summary = {}
+        for t in status['timings']:
+            key = f"{t['stage']}:{t['imgsz']}x{t['batch_size']}"
+            entry = summary.setdefault(key, {'first_ms': t['ms'], 'last_ms': t['ms']})
+            entry['last_ms'] = t['ms']
+        status['summary'] = summary
+        return status
+    
+    def is_ready(self):
+        """模型已加载，且预热已完成（或未启用预热）
+
+        按需加载模式（MODEL_PRELOAD=lazy）下启动时不加载模型也不预热，
+        首个请求承担加载开销，服务始终视为就绪。
+        """
+        if self.preload_mode == 'lazy':
+            return True
+        if self._active_model is None:
+            return False
+        return not Config.WARMUP_ENABLED or self._warmup['state'] == 'done'
+    
+    def _infer_batch(self, contexts):
+        """推理阶段：对一批请求上下文执行推理，在上下文中记录 (框, 置信度, 类别, 类别表) 或异常
+
+        单模型检测中使用同一模型的图像合并为一次推理；级联和切片检测逐张执行。
+        所有模型计算都在推理阶段的单个线程中进行，解码和编码在各自的线程池中与之重叠。
+        """
+        groups = {}
+        for ctx in contexts:
+            ctx['progress']('inference', 0.3)
+            if ctx['mode'] == 'warmup':
+                try:
+                    ctx['model_entry'].model.predict(ctx['imgs'], conf=self.conf, imgsz=ctx['imgsz'])
+                except Exception as e:
+                    ctx['error'] = e
+            elif ctx['mode'] == 'single':
+                model = ctx['model_entry'].model
+                groups.setdefault(id(model), (model, []))[1].append(ctx)
+            else:
+                try:
+                    boxes, confs, class_names = ctx['detector'].detect(ctx['img'])
+                    ctx['raw'] = (boxes, confs) + self.postprocessor.names_to_ids(class_names)
+                except Exception as e:
+                    ctx['error'] = e
+
+        for model, group in groups.values():
+            try:
+                if all('prepared' in ctx for ctx in group):
+                    outputs = model.predict_prepared([ctx['prepared'] for ctx in group], conf=self.conf)
+                else:
+                    outputs = model.predict([ctx['img'] for ctx in group], conf=self.conf, imgsz=self.imgsz)
+                for ctx, output in zip(group, outputs):
+                    # 一次性转换为NumPy数组，不再逐框访问张量
+                    ctx['raw'] = result_to_arrays(output) + (output.names,)
+            except Exception as e:
+                for ctx in group:
+                    ctx['error'] = e
+        return contexts
+
+    def _create_executors(self):
+        """创建三阶段检测流水线和异步任务线程池"""
+        # 推理阶段：动态微批处理调度器，单线程执行并合并并发请求的推理
+        self.batcher = MicroBatcher(
+            self._infer_batch,
+            max_batch_size=Config.BATCH_MAX_SIZE,
+            max_wait_ms=Config.BATCH_MAX_WAIT_MS,
+            name='detection-batcher',
+            max_queue=max(Config.PIPELINE_QUEUE_SIZE, Config.BATCH_MAX_SIZE)
+        )
+        # 解码/预处理 -> 推理 -> 后处理/编码，阶段之间为有界队列
+        self.pipeline = Pipeline([
+            ('preprocess', StagePool(self._preprocess_stage, workers=Config.PIPELINE_PREPROCESS_WORKERS,
+                                     max_queue=Config.PIPELINE_QUEUE_SIZE, name='detection-preprocess')),
+            ('inference', self.batcher),
+            ('postprocess', StagePool(self._postprocess_stage, workers=Config.PIPELINE_POSTPROCESS_WORKERS,
+                                      max_queue=Config.PIPELINE_QUEUE_SIZE, name='detection-postprocess'))
+        ])
+        # 规则检查：后处理阶段生成检测结果后提交，与标注/编码并行执行
+        self.rules_pool = StagePool(self._rules_stage, workers=Config.PIPELINE_RULES_WORKERS,
+                                    max_queue=Config.PIPELINE_QUEUE_SIZE, name='detection-rules')
+        # 异步检测任务：有界线程池 + 有界队列
+        self.job_manager = JobManager(
+            max_workers=Config.JOB_WORKERS,
+            max_queue=Config.JOB_QUEUE_SIZE,
+            result_ttl=Config.JOB_RESULT_TTL,
+            name='detection-job',
+            # 任务状态和结果写入共享的缓存目录，任一工作进程都能查询
+            store=lambda: self.result_cache
+        )
+    
+    def after_fork(self, workers=1):
+        """在 fork 出的工作进程中调用
+
+        模型权重继承自主进程，无需重新加载；主进程中的线程、队列和锁
+        在子进程中不可用，重新创建调度器和任务线程池。
+        Args:
+            workers: 工作进程总数，大于1时拒绝只作用于单个进程的模型切换
+        """
+        self.server_workers = workers
+        self._create_executors()
+        if Config.TORCH_NUM_THREADS > 0:
+            import torch
+            torch.set_num_threads(Config.TORCH_NUM_THREADS)
+        self.logger.info(f"工作进程 {os.getpid()} 已重建调度器，共享模型: {self.current_model_path}")
+    
+    def shutdown(self):
+        """停止检测流水线的各阶段线程"""
+        self.pipeline.shutdown(wait=False)
+        self.rules_pool.shutdown(wait=False)
+    
+    def get_encoder_stats(self):
+        """获取各图像编码器的耗时与字节统计"""
+        return get_encoder_stats()
+    
+    def get_batching_stats(self):
+        """获取微批处理的延迟与占用率统计"""
+        return self.batcher.get_stats()
+    
+    def get_pipeline_stats(self):
+        """获取检测流水线各阶段的队列深度与耗时"""
+        stats = self.pipeline.get_stats()
+        stats['stages']['rules'] = self.rules_pool.get_stats()
+        return stats
     
     def draw_chinese_text(self, img, text, pos, color, box_width):
         """在图像上绘制中文文本
         Args:
-            img: OpenCV图像
+            img: OpenCV图像，会被原地修改
             text: 要绘制的文本
             pos: 文本位置 (x, y)
             color: 文本颜色
             box_width: 检测框的宽度，用于动态调整字体大小
         """
-        from PIL import Image, ImageDraw, ImageFont
-        import numpy as np
-        
-        # 计算动态字体大小
-        img_height, img_width = img.shape[:2]
-        base_size = min(img_width, img_height)
-        # 字体大小基于图像尺寸和检测框宽度动态调整
-        font_size = int(min(base_size * 0.03, box_width * 0.3))  # 限制字体大小不超过框宽的30%
-        font_size = max(font_size, 12)  # 设置最小字体大小为12
-        
-        # 将OpenCV图像转换为PIL图像
-        img_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(img_pil)
-        
-        # 加载字体
-        font = ImageFont.truetype(self.font_path, font_size)
-        
-        # 获取文本大小
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # 绘制半透明背景
-        x, y = pos
-        padding = font_size // 4
-        background_coords = [
-            x - padding,
-            y - padding,
-            x + text_width + padding,
-            y + text_height + padding
-        ]
-        
-        # 确保背景不超出图像边界
-        background_coords = [
-            max(0, background_coords[0]),
-            max(0, background_coords[1]),
-            min(img_width, background_coords[2]),
-            min(img_height, background_coords[3])
-        ]
-        
-        # 绘制半透明背景
-        overlay = Image.new('RGBA', img_pil.size, (0, 0, 0, 0))
-        overlay_draw = ImageDraw.Draw(overlay)
-        overlay_draw.rectangle(background_coords, fill=(0, 0, 0, 128))
-        img_pil = Image.alpha_composite(img_pil.convert('RGBA'), overlay)
+        # 标签按 (文本, 字号, 颜色) 缓存光栅化结果，只在标签区域内混合
+        return self.label_renderer.draw(img, text, pos, color, box_width)
+    
+    def to_compact_result(self, result, thumbnail_size=None):
+        """将检测结果转换为紧凑格式，由前端自行绘制标注
         
-        # 绘制文本
-        draw = ImageDraw.Draw(img_pil)
-        draw.text(pos, text, font=font, fill=color)
+        检测框以扁平整数数组给出，类别以下标引用 classes/colors 表，
+        不包含全分辨率标注图像。
+        Args:
+            result: process_image 的返回值
+            thumbnail_size: 可选的预览缩略图最长边（像素），缩略图为不含标注的JPEG
+        Returns:
+            {'success': True, 'data': {...}}
+        """
+        if not result.get('success'):
+            return result
+        data = result['data']
+        classes = []
+        class_index = {}
+        boxes, labels, scores = [], [], []
+        for detection in data['detections']:
+            name = detection['class']
+            if name not in class_index:
+                class_index[name] = len(classes)
+                classes.append(name)
+            boxes.extend(detection['bbox'])
+            labels.append(class_index[name])
+            scores.append(round(detection['confidence'], 3))
         
-        # 将PIL图像转换回OpenCV图像
-        return cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
+        compact = {
+            'format': 'compact',
+            'image_size': data.get('image_size'),
+            'classes': classes,
+            'categories': [self.CATEGORY_MAPPING.get(name, {}).get('category', '其他') for name in classes],
+            'colors': ['#%02X%02X%02X' % self.HIGH_SATURATION_COLORS.get(name, self.DEFAULT_COLOR)
+                       for name in classes],
+            'boxes': boxes,
+            'labels': labels,
+            'scores': scores,
+            'class_counts': data['class_counts'],
+            'render_token': data.get('render_token'),
+            'message': data.get('message')
+        }
+        if thumbnail_size and data.get('render_token'):
+            try:
+                thumbnail, _ = self.render_image(data['render_token'], 'jpeg', quality=80,
+                                                 max_side=thumbnail_size, annotate=False)
+                compact['thumbnail'] = base64.b64encode(thumbnail).decode('utf-8')
+            except KeyError as e:
+                self.logger.warning(f"生成预览缩略图失败: {str(e)}")
+                compact['thumbnail'] = None
+        return {'success': True, 'data': compact}
     
-    def process_image(self, image_path, model_path=None):
-        """处理图像
+    def submit_job(self, image, model_path=None, mode=None, render=True, rules_checker=None, queue_timeout=None):
+        """提交异步检测任务
+
+        任务线程只负责把图像提交到检测流水线，任务在流水线结果完成时结束，
+        并发任务由流水线合并为推理批次。
         Args:
-            image_path: 图像文件路径
-            model_path: 可选的模型路径，如果不指定则使用当前加载的模型
+            image: 图像字节或 ImageBuffer，数据需在任务执行期间保持有效
+            model_path: 可选的模型名称或路径
+            mode: 检测模式
+            render: 是否同时生成标注图像
+            rules_checker: 可选的规则检查器，指定时结果中同时包含规则检查结果
+            queue_timeout: 任务队列满时最多等待的秒数，为 None 时立即抛出 QueueFullError
+        Returns:
+            Job
+        Raises:
+            QueueFullError: 任务队列已满
         """
-        # 计算图片哈希值
-        image_hash = self._get_image_hash(image_path)
-        
-        # 尝试从缓存加载结果
-        cached_result = self._load_from_cache(image_hash)
-        if cached_result:
-            self.logger.info(f"从缓存加载检测结果: {image_path}")
-            return cached_result
-
-        # 如果模型未加载，则加载默认模型
-        if self.model is None:
-            if not self.load_model():
-                raise Exception("无法加载模型")
-        
-        # 检查图像文件是否存在
-        if not os.path.exists(image_path):
-            raise Exception(f"图像文件不存在: {image_path}")
-        
-        # 读取图像
-        img = cv2.imread(image_path)
-        if img is None:
-            raise Exception("无法读取图像")
+        return self.job_manager.submit(self.submit_image, image, model_path, mode=mode, render=render,
+                                       rules_checker=rules_checker, with_progress=True,
+                                       queue_timeout=queue_timeout)
+    
+    def get_job(self, job_id):
+        """获取异步检测任务，不存在或已过期时返回None"""
+        return self.job_manager.get(job_id)
+    
+    def get_job_stats(self):
+        """获取异步检测任务统计信息"""
+        return self.job_manager.get_stats()
+    
+    def process_images(self, images, model_path=None, mode=None, max_workers=None, render=True):
+        """并行处理多张图像，按完成顺序逐个产出结果
         
-        # 执行检测
+        最多 max_workers 张图像同时在检测流水线中，各张图像的解码、推理和编码
+        在不同阶段重叠执行，单模型检测的推理由微批处理调度器合并为模型大小的批次；
+        每张图像各自命中或写入结果缓存。
+        Args:
+            images: [(名称, 图像)] 列表，图像格式同 process_image
+            model_path: 可选的模型名称或路径
+            mode: 检测模式
+            max_workers: 同时处理的图像数，默认取 Config.BATCH_UPLOAD_WORKERS
+            render: 是否同时生成标注图像
+        Yields:
+            (序号, 名称, 结果)，失败的图像结果为 {'success': False, 'error': ...}
+        """
+        window = max(1, max_workers or Config.BATCH_UPLOAD_WORKERS)
+        remaining = iter(enumerate(images))
+        pending = {}
+        while True:
+            # 补足在途图像；客户端中途断开时生成器关闭，不再提交剩余图像
+            for index, (name, image) in remaining:
+                pending[self._submit_image(image, model_path, mode=mode, render=render)] = (index, name)
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, name = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.logger.error(f"批量检测 {name} 失败: {str(e)}")
+                    result = {'success': False, 'error': str(e)}
+                yield index, name, result
+    
+    def _submit_image(self, image, model_path=None, image_hash=None, mode=None, progress=None, render=True,
+                      rules_checker=None):
+        """解析本次请求使用的模型后把图像提交到检测流水线，返回结果的 Future"""
+        mode = mode or Config.DETECTION_MODE
+        ctx = {
+            'image': image,
+            'image_hash': image_hash,
+            'mode': mode,
+            'render': render,
+            'rules_checker': rules_checker,
+            'progress': progress or (lambda stage, fraction: None),
+            'mode_params': None
+        }
         try:
-            results = self.model.predict(img, conf=0.25)[0]  # 设置置信度阈值
+            if mode not in self.DETECTION_MODES:
+                raise ValueError(f"不支持的检测模式: {mode}")
+            # 获取本次请求使用的模型，整个请求期间持有同一引用，不受模型切换影响
+            if mode == 'cascade':
+                ctx['detector'], ctx['model_fingerprint'] = self._get_cascade_detector()
+            else:
+                model_entry = self._get_model_entry(model_path)
+                ctx['model_entry'] = model_entry
+                ctx['model_fingerprint'] = model_entry.fingerprint
+                if mode == 'tiled':
+                    tiler = self._get_tiled_detector(model_entry)
+                    ctx['detector'] = tiler
+                    ctx['mode_params'] = {'mode': mode, 'tile_size': tiler.tile_size, 'overlap': tiler.overlap}
         except Exception as e:
-            raise Exception(f"模型预测失败: {str(e)}")
-        
-        # 处理检测结果
-        detections = []
-        class_counts = {}
+            future = Future()
+            future.set_exception(e)
+            return future
+        return self.pipeline.submit(ctx)
+    
+    def _preprocess_stage(self, ctx):
+        """解码/预处理阶段：读取图像、查询缓存、解码，导出模型后端同时完成 letterbox 和归一化"""
+        image = ctx.pop('image')
+        # 只读取一次图像数据，哈希与解码共用同一缓冲区
+        try:
+            image_buffer = self._open_image_source(image, ctx['image_hash'])
+        except FileNotFoundError as e:
+            raise Exception(str(e))
         
-        # 从结果中获取检测框
-        boxes = results.boxes
-        for box in boxes:
-            x1, y1, x2, y2 = box.xyxy[0].tolist()
-            conf = box.conf[0].item()
-            cls = box.cls[0].item()
-            class_name = results.names[int(cls)]
-            
-            # 获取类别信息
-            category_info = self.CATEGORY_MAPPING.get(class_name, {'name': class_name, 'category': '其他', 'color': '#666666'})
-            category_name = category_info['category']
-            display_name = category_info['name']
-            color = category_info['color']
-            
-            # 更新类别统计
-            if category_name not in class_counts:
-                class_counts[category_name] = {'count': 1, 'items': [display_name]}
-            else:
-                class_counts[category_name]['count'] += 1
-                if display_name not in class_counts[category_name]['items']:
-                    class_counts[category_name]['items'].append(display_name)
-            
-            # 使用高饱和度的颜色
-            HIGH_SATURATION_COLORS = {
-                '起重机': (255, 0, 0),     # 红色
-                '塔吊': (0, 255, 0),      # 绿色
-                '挖掘机': (255, 128, 0),   # 橙色
-                '大门': (255, 0, 255),     # 洋红
-                '搅拌机': (0, 255, 255),   # 青色
-                '办公室': (255, 255, 0),   # 黄色
-                '红线': (255, 0, 0),      # 红色
-                '道路': (128, 0, 255),    # 紫色
-                '楼梯': (0, 128, 255),    # 蓝色
-                '钢筋加工厂': (255, 64, 0), # 橙红色
-                '宿舍': (0, 255, 128),    # 青绿色
-                '厕所': (128, 255, 0)     # 黄绿色
-            }
-            color = HIGH_SATURATION_COLORS.get(display_name, (0, 0, 255))
-            
-            # 计算框的宽度
-            box_width = int(x2 - x1)
-            
-            # 在图像上绘制边界框，增加线条粗细
-            cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), color, 4)
+        try:
+            # 缓存键同时包含图片哈希、模型指纹和推理参数
+            cache_key = self._get_cache_key(image_buffer.md5, ctx['model_fingerprint'], ctx['mode_params'])
             
-            # 绘制中文标签
-            label = f"{display_name}"
-            # 调整标签位置到框的上方
-            label_y = max(int(y1) - 5, 0)  # 减小标签和框的间距
-            img = self.draw_chinese_text(img, label, (int(x1), label_y), color, box_width)
+            # 尝试从缓存加载结果
+            cached_result = self._load_from_cache(cache_key, render=ctx['render'])
+            if cached_result:
+                self.logger.info(f"从缓存加载检测结果: {image_buffer.md5}")
+                return Completed(cached_result)
             
-            detection = {
-                'bbox': [int(x1), int(y1), int(x2), int(y2)],
-                'confidence': float(conf),
-                'class': display_name,
-                'category': category_name,
-                'color': color
-            }
-            detections.append(detection)
+            # 缓存未命中时才解码图像
+            ctx['progress']('decode', 0.1)
+            img = self._decode_image(image_buffer)
+            ctx['image_hash'] = image_buffer.md5
+            # 保留原图，供之后按需渲染标注图像
+            self._save_source(image_buffer)
+        finally:
+            if image_buffer is not image:
+                image_buffer.close()
         
-        # 将检测后的图像编码为base64
-        try:
-            _, buffer = cv2.imencode('.png', img)
-            detected_image = base64.b64encode(buffer).decode('utf-8')
-        except Exception as e:
-            self.logger.error(f"图像编码失败: {str(e)}")
-            detected_image = None
+        ctx['cache_key'] = cache_key
+        ctx['img'] = img
+        if ctx['mode'] == 'single':
+            model = ctx['model_entry'].model
+            if hasattr(model, 'prepare'):
+                ctx['prepared'] = model.prepare(img, self.imgsz)
+        return ctx
+    
+    def _postprocess_stage(self, ctx):
+        """后处理/编码阶段：生成检测结果、绘制标注、编码并写入缓存"""
+        if 'error' in ctx:
+            raise Exception(f"模型预测失败: {str(ctx['error'])}")
+        boxes, confs, classes, names = ctx['raw']
+        img = ctx['img']
+        cache_key = ctx['cache_key']
+        
+        # 处理检测结果
+        ctx['progress']('annotate', 0.7)
+        detections, class_counts = self.postprocessor.build(boxes, confs, classes, names)
+        
+        # 规则检查只依赖检测结果，先提交到规则检查线程，与下面的标注和编码并行
+        rules_future = None
+        if ctx['rules_checker'] is not None:
+            rules_future = self.rules_pool.submit((ctx['rules_checker'], detections))
+        
+        # 绘制标注并编码为base64，render=False 时推迟到 render_image
+        image_bytes = None
+        detected_image = None
+        if ctx['render']:
+            ctx['progress']('encode', 0.9)
+            try:
+                self._draw_detections(img, detections)
+                image_bytes = get_encoder().encode(img)
+                detected_image = base64.b64encode(image_bytes).decode('utf-8')
+            except Exception as e:
+                self.logger.error(f"图像编码失败: {str(e)}")
         
         self.logger.info(f"检测到 {len(detections)} 个目标")
         self.logger.info(f"类别统计: {class_counts}")
@@ -315,14 +896,82 @@ class DetectionService:
                 'detections': detections,
                 'class_counts': class_counts,
                 'detected_image': detected_image,
+                'detected_image_format': get_encoder().mimetype if detected_image else None,
+                'render_token': cache_key,
+                'image_size': [int(img.shape[1]), int(img.shape[0])],
                 'message': '检测成功'
             }
         }
         
-        # 保存结果到缓存
-        self._save_to_cache(image_hash, result)
+        # 保存结果到缓存，规则检查结果不写入检测结果缓存（规则结果另有缓存）
+        self._save_to_cache(cache_key, result, image_bytes, ctx['model_fingerprint'], ctx['image_hash'])
         
+        if rules_future is not None:
+            result['data']['rule_results'] = rules_future.result()
         return result
+    
+    @staticmethod
+    def _rules_stage(item):
+        """规则检查阶段：在内存中的检测结果上执行规则检查"""
+        rules_checker, detections = item
+        return rules_checker.check_rules(detections)
+    
+    def process_image(self, image, model_path=None, image_hash=None, mode=None, progress=None, render=True,
+                      rules_checker=None):
+        """处理图像
+        
+        图像依次经过检测流水线的解码/预处理、推理、后处理/编码三个阶段，
+        调用线程只等待结果。
+        Args:
+            image: 图像文件路径、图像字节（bytes/bytearray/memoryview）或 ImageBuffer
+            model_path: 可选的模型名称或路径，如果不指定则使用当前加载的模型
+            image_hash: 可选的图像MD5，已在读取时计算过则不再重复计算
+            mode: 检测模式，'single' 为单模型检测，'cascade' 为两阶段级联检测，
+                'tiled' 为超大图纸切片检测，默认取配置
+            progress: 可选的进度回调 progress(stage, fraction)，供异步任务上报进度
+            render: 是否同时生成标注图像；为False时只返回检测结果和 render_token，
+                标注图像可随后通过 render_image 按需生成
+            rules_checker: 可选的规则检查器，指定时直接在检测结果上执行规则检查，
+                结果写入 data['rule_results']，省去客户端回传检测结果再调用规则接口
+        """
+        return self.submit_image(image, model_path, image_hash, mode, progress, render, rules_checker).result()
+
+    def submit_image(self, image, model_path=None, image_hash=None, mode=None, progress=None, render=True,
+                     rules_checker=None):
+        """同 process_image，但不等待结果，返回结果的 Future"""
+        future = self._submit_image(image, model_path, image_hash, mode, progress, render, rules_checker)
+        if rules_checker is None:
+            return future
+        
+        chained = Future()
+        
+        def on_rules_done(rules_future, result):
+            error = rules_future.exception()
+            if error is not None:
+                chained.set_exception(error)
+                return
+            result['data']['rule_results'] = rules_future.result()
+            chained.set_result(result)
+        
+        def on_detection_done(detection_future):
+            error = detection_future.exception()
+            if error is not None:
+                chained.set_exception(error)
+                return
+            result = detection_future.result()
+            if 'rule_results' in result['data']:
+                chained.set_result(result)
+                return
+            # 命中检测结果缓存时未经过后处理阶段，交给规则检查线程（规则结果通常也已缓存）
+            try:
+                rules_future = self.rules_pool.submit((rules_checker, result['data']['detections']))
+            except Exception as e:
+                chained.set_exception(e)
+                return
+            rules_future.add_done_callback(lambda f: on_rules_done(f, result))
+        
+        future.add_done_callback(on_detection_done)
+        return chained
 
 # 创建服务实例
 detection_service = DetectionService()
@@ -0,0 +1,151 @@
+import time
+import logging
+import threading
+
+import cv2
+
+from backend.config.config import Config
+
+logger = logging.getLogger(__name__)
+
+try:
+    from turbojpeg import TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+# 支持的输出格式: (扩展名, MIME类型, 质量参数, 质量范围)
+IMAGE_FORMATS = {
+    'png': ('.png', 'image/png', cv2.IMWRITE_PNG_COMPRESSION, (0, 9)),
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY, (1, 100)),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY, (1, 100))
+}
+FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+_turbo = None
+_turbo_lock = threading.Lock()
+_turbo_checked = False
+
+
+def _get_turbo():
+    """按需加载 libjpeg-turbo 编码器，未安装时返回 None"""
+    global _turbo, _turbo_checked
+    if _turbo_checked:
+        return _turbo
+    with _turbo_lock:
+        if not _turbo_checked:
+            if TurboJPEG is not None and Config.USE_TURBOJPEG:
+                try:
+                    _turbo = TurboJPEG()
+                    logger.info("使用 libjpeg-turbo 编码JPEG")
+                except (OSError, RuntimeError) as e:
+                    logger.warning(f"加载 libjpeg-turbo 失败，使用OpenCV编码JPEG: {str(e)}")
+            _turbo_checked = True
+    return _turbo
+
+
+def _default_quality(fmt):
+    return {
+        'png': Config.PNG_COMPRESSION,
+        'jpeg': Config.JPEG_QUALITY,
+        'webp': Config.WEBP_QUALITY
+    }[fmt]
+
+
+def normalize_format(fmt):
+    fmt = (fmt or Config.IMAGE_FORMAT).lower()
+    fmt = FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的图像格式: {fmt}")
+    return fmt
+
+
+class ImageEncoder:
+    """单一格式和质量的图像编码器
+
+    编码参数在构造时计算一次并复用；每次编码记录耗时与输入/输出字节数，
+    便于按部署环境权衡带宽和CPU。
+    """
+
+    def __init__(self, fmt=None, quality=None):
+        """
+        Args:
+            fmt: 输出格式 png / jpeg / webp，默认取 Config.IMAGE_FORMAT
+            quality: PNG 为压缩级别 (0-9)，JPEG/WebP 为质量 (1-100)，默认取配置
+        """
+        self.format = normalize_format(fmt)
+        self.ext, self.mimetype, quality_flag, (low, high) = IMAGE_FORMATS[self.format]
+        quality = int(_default_quality(self.format) if quality is None else quality)
+        if not low <= quality <= high:
+            raise ValueError(f"{self.format} 的质量参数必须在 {low}-{high} 之间")
+        self.quality = quality
+        self._params = [quality_flag, quality]
+
+        self._lock = threading.Lock()
+        self._stats = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'input_bytes': 0, 'output_bytes': 0}
+
+    def encode(self, img):
+        """编码BGR图像
+        Returns:
+            编码后的字节
+        """
+        start = time.perf_counter()
+        turbo = _get_turbo() if self.format == 'jpeg' else None
+        if turbo is not None:
+            data = turbo.encode(img, quality=self.quality)
+        else:
+            ok, buffer = cv2.imencode(self.ext, img, self._params)
+            if not ok:
+                raise Exception(f"图像编码失败: {self.format}")
+            data = buffer.tobytes()
+        elapsed = (time.perf_counter() - start) * 1000.0
+
+        with self._lock:
+            self._stats['count'] += 1
+            self._stats['total_ms'] += elapsed
+            self._stats['max_ms'] = max(self._stats['max_ms'], elapsed)
+            self._stats['input_bytes'] += img.nbytes
+            self._stats['output_bytes'] += len(data)
+        return data
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        count = stats['count']
+        stats.update({
+            'format': self.format,
+            'quality': self.quality,
+            'avg_ms': stats['total_ms'] / count if count else 0.0,
+            'avg_output_bytes': stats['output_bytes'] / count if count else 0.0,
+            'compression_ratio': stats['input_bytes'] / stats['output_bytes'] if stats['output_bytes'] else 0.0
+        })
+        return stats
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(fmt=None, quality=None):
+    """获取 (格式, 质量) 对应的共享编码器实例
+    Raises:
+        ValueError: 格式或质量参数不合法
+    """
+    fmt = normalize_format(fmt)
+    key = (fmt, int(_default_quality(fmt) if quality is None else quality))
+    encoder = _encoders.get(key)
+    if encoder is None:
+        encoder = ImageEncoder(fmt, quality)
+        with _encoders_lock:
+            encoder = _encoders.setdefault(key, encoder)
+    return encoder
+
+
+def get_encoder_stats():
+    """按 格式:质量 汇总各编码器的耗时与字节统计"""
+    with _encoders_lock:
+        encoders = list(_encoders.values())
+    return {
+        'default_format': normalize_format(None),
+        'turbojpeg': _turbo is not None,
+        'encoders': {f"{e.format}:{e.quality}": e.get_stats() for e in encoders}
+    }
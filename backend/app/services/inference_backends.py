@@ -0,0 +1,244 @@
+import os
+import ast
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+from backend.app.services.box_ops import nms
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ('torch', 'onnxruntime', 'openvino')
+
+_export_lock = threading.Lock()
+
+
+def _is_stale(exported_path, weights_path):
+    return not os.path.exists(exported_path) or os.path.getmtime(exported_path) < os.path.getmtime(weights_path)
+
+
+def export_model(weights_path, fmt, imgsz=640):
+    """将 .pt 权重导出为 ONNX / OpenVINO 模型，导出结果缓存在权重文件旁
+
+    导出文件比权重文件旧时重新导出。
+    Args:
+        weights_path: .pt 权重路径
+        fmt: 'onnx' 或 'openvino'
+        imgsz: 导出时的输入尺寸（导出为动态尺寸，推理时可使用其他尺寸）
+    Returns:
+        ONNX 文件路径或 OpenVINO 的 .xml 文件路径
+    """
+    stem = os.path.splitext(weights_path)[0]
+    if fmt == 'onnx':
+        exported_path = stem + '.onnx'
+    elif fmt == 'openvino':
+        exported_path = os.path.join(f"{stem}_openvino_model", os.path.basename(stem) + '.xml')
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+    with _export_lock:
+        if _is_stale(exported_path, weights_path):
+            from ultralytics import YOLO
+            logger.info(f"导出 {weights_path} 为 {fmt} 格式...")
+            YOLO(weights_path).export(format=fmt, imgsz=imgsz, dynamic=True)
+            if not os.path.exists(exported_path):
+                raise Exception(f"导出 {fmt} 模型失败: 未找到 {exported_path}")
+            logger.info(f"导出完成: {exported_path}")
+    return exported_path
+
+
+def letterbox(img, size):
+    """等比缩放并填充为 size x size，返回 (图像, 缩放比例, (左填充, 上填充))"""
+    height, width = img.shape[:2]
+    ratio = min(size / height, size / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    if (new_w, new_h) != (width, height):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_w, pad_h = size - new_w, size - new_h
+    left, top = int(round(pad_w / 2 - 0.1)), int(round(pad_h / 2 - 0.1))
+    img = cv2.copyMakeBorder(img, top, pad_h - top, left, pad_w - left,
+                             cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return img, ratio, (left, top)
+
+
+def preprocess(imgs, imgsz):
+    """把BGR图像列表转换为导出模型的输入张量
+    Returns:
+        ((批, 3, imgsz, imgsz) float32 RGB 0-1 张量, [(缩放比例, 填充, 原图高宽), ...])
+    """
+    batch, transforms = [], []
+    for img in imgs:
+        padded, ratio, pad = letterbox(img, imgsz)
+        batch.append(padded[..., ::-1].transpose(2, 0, 1))
+        transforms.append((ratio, pad, img.shape[:2]))
+    batch = np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0
+    return batch, transforms
+
+
+class _Boxes:
+    """与 ultralytics Boxes 兼容的最小接口：data 为 (N, 6) 的 x1,y1,x2,y2,conf,cls"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class DetectionResult:
+    """与 ultralytics Results 兼容的最小结果对象（boxes.data 与 names）"""
+
+    def __init__(self, data, names):
+        self.boxes = _Boxes(data)
+        self.names = names
+
+
+class ExportedModel:
+    """导出模型的公共预处理与后处理
+
+    输出张量形状为 (批, 4 + 类别数, 候选数)，与 YOLOv8/YOLO11 的导出格式一致。
+    子类实现 _run(batch) 和 names。
+    """
+
+    def __init__(self, path, iou_threshold=0.7, max_det=300):
+        self.path = path
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+        self.names = {}
+
+    def _run(self, batch):
+        raise NotImplementedError
+
+    def _postprocess(self, prediction, conf, transform):
+        ratio, (left, top), (height, width) = transform
+        prediction = prediction.T  # (候选数, 4 + 类别数)
+        scores_all = prediction[:, 4:]
+        class_ids = scores_all.argmax(axis=1)
+        scores = scores_all[np.arange(len(scores_all)), class_ids]
+        keep = scores > conf
+        if not keep.any():
+            return np.zeros((0, 6), dtype=np.float32)
+        xywh, scores, class_ids = prediction[keep, :4], scores[keep], class_ids[keep]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+        order = nms(boxes, scores, self.iou_threshold, class_ids)[:self.max_det]
+        boxes, scores, class_ids = boxes[order], scores[order], class_ids[order]
+
+        # 映射回原图坐标
+        boxes -= np.array([left, top, left, top], dtype=np.float32)
+        boxes /= ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+        return np.concatenate([boxes, scores[:, None], class_ids[:, None].astype(np.float32)], axis=1)
+
+    def prepare(self, img, imgsz=640):
+        """在调用线程中完成单张图像的 letterbox 和归一化，返回 predict_prepared 的输入"""
+        batch, transforms = preprocess([img], imgsz)
+        return batch[0], transforms[0]
+
+    def predict_prepared(self, prepared, conf=0.25):
+        """对 prepare 的输出列表执行推理和后处理，返回结果列表"""
+        if not prepared:
+            return []
+        outputs = self._run(np.stack([tensor for tensor, _ in prepared]))
+        return [DetectionResult(self._postprocess(output, conf, transform), self.names)
+                for output, (_, transform) in zip(outputs, prepared)]
+
+    def predict(self, source, conf=0.25, imgsz=640, **kwargs):
+        """与 ultralytics 的 predict 接口一致：接收单张图像或图像列表，返回结果列表"""
+        imgs = source if isinstance(source, (list, tuple)) else [source]
+        return self.predict_prepared([self.prepare(img, imgsz) for img in imgs], conf)
+
+    def __call__(self, source, **kwargs):
+        return self.predict(source, **kwargs)
+
+
+class OnnxRuntimeModel(ExportedModel):
+    """ONNX Runtime 推理后端"""
+
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0, **kwargs):
+        """
+        Args:
+            path: ONNX 模型路径
+            intra_op_threads: 单个算子内部的并行线程数，0 为由 ONNX Runtime 决定
+            inter_op_threads: 算子之间的并行线程数，0 为由 ONNX Runtime 决定
+        """
+        super().__init__(path, **kwargs)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if 'names' in metadata:
+            self.names = ast.literal_eval(metadata['names'])
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVINOModel(ExportedModel):
+    """OpenVINO 推理后端"""
+
+    def __init__(self, path, num_threads=0, **kwargs):
+        """
+        Args:
+            path: OpenVINO 模型的 .xml 路径
+            num_threads: 推理线程数，0 为由 OpenVINO 决定
+        """
+        super().__init__(path, **kwargs)
+        import openvino as ov
+
+        core = ov.Core()
+        config = {'PERFORMANCE_HINT': 'THROUGHPUT'}
+        if num_threads > 0:
+            config['INFERENCE_NUM_THREADS'] = num_threads
+        self.compiled_model = core.compile_model(core.read_model(path), 'CPU', config)
+
+        metadata_path = os.path.join(os.path.dirname(path), 'metadata.yaml')
+        if os.path.exists(metadata_path):
+            import yaml
+            with open(metadata_path, encoding='utf-8') as f:
+                self.names = {int(k): v for k, v in (yaml.safe_load(f) or {}).get('names', {}).items()}
+
+    def _run(self, batch):
+        # 每次推理使用独立的推理请求，支持多线程并发调用
+        request = self.compiled_model.create_infer_request()
+        request.infer({0: batch})
+        return request.get_output_tensor(0).data.copy()
+
+
+def create_loader(backend, imgsz=640, intra_op_threads=0, inter_op_threads=0):
+    """返回 ModelRegistry 使用的模型加载函数
+    Args:
+        backend: 'torch' / 'onnxruntime' / 'openvino'
+        imgsz: 导出模型时的输入尺寸
+        intra_op_threads: 算子内并行线程数（OpenVINO 作为推理线程数）
+        inter_op_threads: 算子间并行线程数（仅 ONNX Runtime）
+    Returns:
+        loader(path) -> model
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"不支持的推理后端: {backend}")
+
+    def load(path):
+        if path.endswith('.onnx'):
+            # 预先导出或量化得到的 ONNX 模型（如 best_int8.onnx）与所选后端无关，统一由 ONNX Runtime 加载
+            return OnnxRuntimeModel(path, intra_op_threads, inter_op_threads)
+        if backend == 'torch':
+            from ultralytics import YOLO
+            return YOLO(path)
+        if backend == 'onnxruntime':
+            return OnnxRuntimeModel(export_model(path, 'onnx', imgsz), intra_op_threads, inter_op_threads)
+        xml_path = path if path.endswith('.xml') else export_model(path, 'openvino', imgsz)
+        return OpenVINOModel(xml_path, intra_op_threads)
+
+    return load
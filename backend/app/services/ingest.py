@@ -0,0 +1,105 @@
+import io
+import os
+import mmap
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # 流式读取的分块大小
+MMAP_THRESHOLD = 8 * 1024 * 1024  # 超过该大小且有文件描述符时使用内存映射
+
+
+class ImageBuffer:
+    """单次读取的图像字节缓冲区，读取时同步计算MD5
+
+    小文件读入内存，已落盘的大文件（如werkzeug溢出到临时文件的上传）
+    直接内存映射，后续哈希和 cv2.imdecode 都基于同一块缓冲区。
+    """
+
+    def __init__(self, data, md5, mapped=None):
+        self.data = data
+        self.md5 = md5
+        self._mapped = mapped
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def close(self):
+        if self._mapped is not None:
+            try:
+                self.data.release()
+                self._mapped.close()
+            except BufferError:
+                # 仍有数组引用该缓冲区时交由垃圾回收释放映射
+                logger.debug("图像缓冲区仍被引用，延迟释放内存映射")
+            self._mapped = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _file_size(stream):
+    """已落盘的文件流返回文件大小，内存中的流返回 None
+
+    SpooledTemporaryFile 调用 fileno() 会强制把内存中的数据写入磁盘临时文件，
+    因此尚未溢出到磁盘（_rolled 为 False）的流直接按内存流处理。
+    """
+    if not getattr(stream, '_rolled', True):
+        return None
+    try:
+        return os.fstat(stream.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def read_image_stream(stream, chunk_size=CHUNK_SIZE, mmap_threshold=MMAP_THRESHOLD):
+    """从文件流读取图像字节并增量计算MD5
+    Args:
+        stream: 可读的二进制文件对象（如 request.files['file'].stream）
+        chunk_size: 分块大小
+        mmap_threshold: 使用内存映射的最小文件大小
+    Returns:
+        ImageBuffer
+    """
+    size = _file_size(stream)
+    if size is not None and size >= mmap_threshold:
+        try:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning(f"内存映射上传文件失败，改为流式读取: {str(e)}")
+        else:
+            view = memoryview(mapped)
+            md5 = hashlib.md5()
+            for offset in range(0, len(view), chunk_size):
+                md5.update(view[offset:offset + chunk_size])
+            return ImageBuffer(view, md5.hexdigest(), mapped=mapped)
+
+    md5 = hashlib.md5()
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        md5.update(chunk)
+        buffer.extend(chunk)
+    return ImageBuffer(buffer, md5.hexdigest())
+
+
+def read_image_bytes(data):
+    """包装已在内存中的字节数据并计算MD5"""
+    if isinstance(data, ImageBuffer):
+        return data
+    return ImageBuffer(data, hashlib.md5(data).hexdigest())
+
+
+def read_image_file(image_path, **kwargs):
+    """从磁盘路径读取图像字节，只读取一次（内存映射在文件关闭后依然有效）"""
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"图像文件不存在: {image_path}")
+    with open(image_path, 'rb') as f:
+        return read_image_stream(f, **kwargs)
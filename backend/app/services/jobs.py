@@ -0,0 +1,302 @@
+import re
+import time
+import uuid
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+
+class Job:
+    """异步任务"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, fn, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = self.QUEUED
+        self.stage = self.QUEUED
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._on_finish = None
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def update_progress(self, stage, progress):
+        """由任务函数回调，报告当前阶段和进度(0~1)"""
+        self.stage = stage
+        self.progress = max(self.progress, float(progress))
+
+    def wait(self, timeout=None):
+        """等待任务结束，返回是否已结束"""
+        return self._done.wait(timeout)
+
+    def _run(self, on_start=None):
+        """执行任务函数
+
+        任务函数返回 Future 时只负责提交，任务在 Future 完成时结束，
+        工作线程不必阻塞等待（如检测流水线中的推理）。
+        """
+        self.status = self.RUNNING
+        self.stage = self.RUNNING
+        self.started_at = time.time()
+        if on_start is not None:
+            on_start(self)
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self._finish(error=e)
+            return
+        # 释放输入数据，结果保留到过期
+        self.args = ()
+        self.kwargs = {}
+        if isinstance(result, Future):
+            result.add_done_callback(self._on_future_done)
+        else:
+            self._finish(result=result)
+
+    def _on_future_done(self, future):
+        error = future.exception()
+        if error is not None:
+            self._finish(error=error)
+        else:
+            self._finish(result=future.result())
+
+    def _finish(self, result=None, error=None):
+        if error is not None:
+            logger.error(f"任务 {self.id} 执行失败: {str(error)}", exc_info=error)
+            self.error = str(error)
+            self.status = self.FAILED
+            self.stage = self.FAILED
+        else:
+            self.result = result
+            self.status = self.DONE
+            self.stage = self.DONE
+            self.progress = 1.0
+        self.finished_at = time.time()
+        self.args = ()
+        self.kwargs = {}
+        # 先写入共享存储再唤醒等待方，等待结束后其他进程即可查到结果
+        if self._on_finish is not None:
+            self._on_finish(self)
+        self._done.set()
+
+    @classmethod
+    def from_record(cls, record):
+        """由共享存储中的任务记录重建任务快照（只读，不可执行）"""
+        info = record['info']
+        job = cls(None, (), {})
+        job.id = info['job_id']
+        job.status = info['status']
+        job.stage = info['stage']
+        job.progress = info['progress']
+        job.created_at = info['created_at']
+        job.started_at = info['started_at']
+        job.finished_at = info['finished_at']
+        job.error = info.get('error')
+        job.result = record.get('result')
+        if job.status in (cls.DONE, cls.FAILED):
+            job._done.set()
+        return job
+
+    def to_record(self):
+        """生成写入共享存储的任务记录"""
+        return {'info': self.to_dict(), 'result': self.result}
+
+    def to_dict(self):
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.started_at is not None:
+            info['queue_time_ms'] = (self.started_at - self.created_at) * 1000.0
+        if self.finished_at is not None and self.started_at is not None:
+            info['run_time_ms'] = (self.finished_at - self.started_at) * 1000.0
+        if self.error is not None:
+            info['error'] = self.error
+        return info
+
+
+class JobManager:
+    """有界工作线程池 + 有界队列的异步任务管理器
+
+    队列满时 submit 抛出 QueueFullError，由接口层转换为 HTTP 429；
+    已结束的任务在 result_ttl 秒后清理。任务函数返回 Future 时，
+    工作线程提交后立即处理下一个任务，在途任务数不受工作线程数限制。
+    指定共享存储时任务状态和结果同时写入存储，其他工作进程也能查询。
+    """
+
+    def __init__(self, max_workers=2, max_queue=16, result_ttl=600, name='job-worker', store=None):
+        """
+        Args:
+            max_workers: 工作线程数
+            max_queue: 等待队列容量
+            result_ttl: 已结束任务的保留时间（秒）
+            name: 工作线程名称前缀
+            store: 可选的共享存储工厂，返回提供 get(key, refresh=) / put(key, meta, tag=) / delete(key)
+                的对象（如 ResultCache），首次读写任务记录时调用
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(1, int(max_queue))
+        self.result_ttl = result_ttl
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stats = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+        self._store = store
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            while len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._run, name=f"{self.name}-{len(self._workers)}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job._run(on_start=self._save)
+            finally:
+                self._queue.task_done()
+
+    def _save(self, job):
+        """将任务状态写入共享存储，写入失败只记录日志"""
+        if self._store is None:
+            return
+        try:
+            self._store().put(job.id, job.to_record(), tag='job')
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"保存任务 {job.id} 状态失败: {str(e)}")
+
+    def _delete(self, job_id):
+        if self._store is not None:
+            self._store().delete(job_id)
+
+    def _load(self, job_id):
+        """从共享存储读取其他工作进程的任务，不存在或已过期时返回 None"""
+        if self._store is None:
+            return None
+        store = self._store()
+        # 记录可能已被其他进程更新，忽略本进程的内存索引
+        cached = store.get(job_id, refresh=True)
+        if cached is None:
+            return None
+        try:
+            job = Job.from_record(cached[0])
+        except (KeyError, TypeError) as e:
+            logger.warning(f"跳过损坏的任务记录 {job_id}: {str(e)}")
+            store.delete(job_id)
+            return None
+        if job.finished and time.time() - job.finished_at > self.result_ttl:
+            store.delete(job_id)
+            return None
+        return job
+
+    def _record_finish(self, job):
+        with self._lock:
+            self._stats['completed' if job.status == Job.DONE else 'failed'] += 1
+        self._save(job)
+
+    def _prune(self):
+        """清理过期的已结束任务"""
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > self.result_ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
+        for job_id in expired:
+            self._delete(job_id)
+
+    def submit(self, fn, *args, with_progress=False, queue_timeout=None, **kwargs):
+        """提交任务
+        Args:
+            fn: 任务函数，可直接返回结果，也可返回结果的 Future
+            with_progress: 为 True 时以 progress 关键字参数传入进度回调
+            queue_timeout: 队列满时最多等待的秒数，为 None 时立即失败
+        Returns:
+            Job
+        Raises:
+            QueueFullError: 队列已满
+        """
+        self._prune()
+        job = Job(fn, args, kwargs)
+        job._on_finish = self._record_finish
+        if with_progress:
+            job.kwargs['progress'] = job.update_progress
+        with self._lock:
+            self._jobs[job.id] = job
+        # 入队前写入，避免工作线程已开始执行后被排队状态覆盖
+        self._save(job)
+        try:
+            if queue_timeout is None:
+                self._queue.put_nowait(job)
+            else:
+                self._queue.put(job, timeout=queue_timeout)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+                self._stats['rejected'] += 1
+            self._delete(job.id)
+            raise QueueFullError(f"任务队列已满（容量 {self.max_queue}），请稍后重试")
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._ensure_workers()
+        return job
+
+    def get(self, job_id):
+        """获取任务，本进程中不存在时查询共享存储，不存在或已过期时返回 None
+
+        任务ID会作为存储键拼接分片路径，只接受 uuid4 的十六进制格式。
+        """
+        if not isinstance(job_id, str) or JOB_ID_PATTERN.match(job_id) is None:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return self._load(job_id)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tracked_jobs'] = len(self._jobs)
+            stats['running'] = sum(1 for job in self._jobs.values() if job.status == Job.RUNNING)
+        stats.update({
+            'queue_depth': self._queue.qsize(),
+            'max_queue': self.max_queue,
+            'max_workers': self.max_workers
+        })
+        return stats
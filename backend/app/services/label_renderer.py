@@ -0,0 +1,148 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 标签背景透明度，与原PIL实现的 (0, 0, 0, 128) 保持一致
+BACKGROUND_ALPHA = 128 / 255.0
+
+
+class LabelRenderer:
+    """带缓存的中文标签渲染器
+
+    每个 (文本, 字号, 颜色) 组合只用PIL光栅化一次，缓存为预乘的
+    缩放/偏移数组；绘制时直接在BGR图像的标签区域(ROI)上原地混合，
+    不再做整图的颜色转换和整图RGBA叠加。
+    """
+
+    def __init__(self, font_path, max_entries=512):
+        """
+        Args:
+            font_path: 中文字体文件路径
+            max_entries: 标签缓存的最大条目数
+        """
+        self.font_path = font_path
+        self.max_entries = max_entries
+        self._fonts = {}
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def compute_font_size(img_shape, box_width):
+        """根据图像尺寸和检测框宽度计算字体大小"""
+        img_height, img_width = img_shape[:2]
+        base_size = min(img_width, img_height)
+        # 字体大小基于图像尺寸和检测框宽度动态调整
+        font_size = int(min(base_size * 0.03, box_width * 0.3))  # 限制字体大小不超过框宽的30%
+        return max(font_size, 12)  # 设置最小字体大小为12
+
+    def _get_font(self, font_size):
+        """按字号缓存字体对象，避免重复加载字体文件"""
+        font = self._fonts.get(font_size)
+        if font is None:
+            from PIL import ImageFont
+            try:
+                font = ImageFont.truetype(self.font_path, font_size)
+            except (OSError, IOError) as e:
+                logger.warning(f"加载字体失败({self.font_path}): {str(e)}，使用默认字体")
+                font = ImageFont.load_default()
+            self._fonts[font_size] = font
+        return font
+
+    def _rasterize(self, text, font_size, color):
+        """光栅化标签，返回 (scale, offset, padding)
+
+        混合公式为 roi = roi * scale + offset，其中背景区域的 scale 含半透明
+        黑底的衰减，文字区域按抗锯齿覆盖率混入文字颜色。
+        """
+        from PIL import Image, ImageDraw
+
+        font = self._get_font(font_size)
+        left, top, right, bottom = font.getbbox(text)
+        text_width = right - left
+        text_height = bottom - top
+        padding = font_size // 4
+
+        # 画布原点对应 (x - padding, y - padding)，背景矩形与PIL一样包含右下边界
+        bg_w = text_width + 2 * padding + 1
+        bg_h = text_height + 2 * padding + 1
+        width = max(bg_w, right + padding)
+        height = max(bg_h, bottom + padding)
+
+        mask_img = Image.new('L', (width, height), 0)
+        ImageDraw.Draw(mask_img).text((padding, padding), text, font=font, fill=255)
+        coverage = np.asarray(mask_img, dtype=np.float32) / 255.0
+
+        background = np.zeros((height, width), dtype=np.float32)
+        background[:bg_h, :bg_w] = BACKGROUND_ALPHA
+
+        # 文字颜色按RGB给出，转换为BGR顺序
+        bgr = np.array(color[::-1], dtype=np.float32)
+        scale = ((1.0 - background) * (1.0 - coverage))[..., None]
+        offset = coverage[..., None] * bgr
+        return scale, offset.astype(np.float32), padding
+
+    def _get_sprite(self, text, font_size, color):
+        key = (text, font_size, tuple(color))
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                self.hits += 1
+                return sprite
+            self.misses += 1
+
+        sprite = self._rasterize(text, font_size, color)
+        with self._lock:
+            self._sprites[key] = sprite
+            while len(self._sprites) > self.max_entries:
+                self._sprites.popitem(last=False)
+        return sprite
+
+    def draw(self, img, text, pos, color, box_width):
+        """在BGR图像上原地绘制标签
+        Args:
+            img: OpenCV图像 (H, W, 3)，会被原地修改
+            text: 要绘制的文本
+            pos: 文本位置 (x, y)
+            color: 文本颜色 (RGB)
+            box_width: 检测框的宽度，用于动态调整字体大小
+        Returns:
+            传入的图像
+        """
+        font_size = self.compute_font_size(img.shape, box_width)
+        scale, offset, padding = self._get_sprite(text, font_size, color)
+
+        img_height, img_width = img.shape[:2]
+        sprite_h, sprite_w = scale.shape[:2]
+        x0 = int(pos[0]) - padding
+        y0 = int(pos[1]) - padding
+
+        # 裁剪到图像边界
+        ix0, iy0 = max(x0, 0), max(y0, 0)
+        ix1, iy1 = min(x0 + sprite_w, img_width), min(y0 + sprite_h, img_height)
+        if ix0 >= ix1 or iy0 >= iy1:
+            return img
+
+        sx0, sy0 = ix0 - x0, iy0 - y0
+        sx1, sy1 = sx0 + (ix1 - ix0), sy0 + (iy1 - iy0)
+
+        roi = img[iy0:iy1, ix0:ix1]
+        blended = roi * scale[sy0:sy1, sx0:sx1] + offset[sy0:sy1, sx0:sx1]
+        np.clip(blended, 0, 255, out=blended)
+        roi[...] = np.rint(blended).astype(img.dtype)
+        return img
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._sprites),
+                'fonts': len(self._fonts),
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,294 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MODEL_EXTENSIONS = ('.pt', '.onnx')
+
+
+_fingerprint_cache = {}
+_fingerprint_lock = threading.Lock()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """计算权重文件内容的MD5指纹，按 (路径, 大小, 修改时间) 缓存避免重复读取"""
+    stat_key = _stat_key(path)
+    with _fingerprint_lock:
+        fingerprint = _fingerprint_cache.get(stat_key)
+    if fingerprint is None:
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                md5.update(chunk)
+        fingerprint = md5.hexdigest()
+        with _fingerprint_lock:
+            _fingerprint_cache[stat_key] = fingerprint
+    return fingerprint
+
+
+def _process_rss():
+    """当前进程常驻内存，psutil 不可用时返回 None"""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        return None
+
+
+def _model_tensor_bytes(model):
+    """统计模型参数与缓冲区占用的字节数"""
+    module = getattr(model, 'model', model)
+    total = 0
+    try:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    except Exception:
+        return None
+    return total
+
+
+class ModelEntry:
+    """已加载到内存中的模型"""
+
+    def __init__(self, name, path, model, fingerprint, load_time, memory_bytes, rss_delta_bytes, stat_key=None):
+        self.name = name
+        self.path = path
+        self.stat_key = stat_key
+        self.model = model
+        self.fingerprint = fingerprint
+        self.load_time = load_time
+        self.memory_bytes = memory_bytes
+        self.rss_delta_bytes = rss_delta_bytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+
+    def touch(self):
+        self.last_used = time.time()
+        self.uses += 1
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'fingerprint': self.fingerprint,
+            'load_time_ms': self.load_time * 1000.0,
+            'memory_bytes': self.memory_bytes,
+            'rss_delta_bytes': self.rss_delta_bytes,
+            'loaded_at': self.loaded_at,
+            'last_used': self.last_used,
+            'uses': self.uses
+        }
+
+
+class ModelRegistry:
+    """模型注册表
+
+    扫描模型目录中的权重文件，按最近使用顺序最多常驻 max_resident 个模型，
+    超出时淘汰最久未使用的模型（固定的当前模型除外）。被淘汰的模型只是从注册表中移除，
+    正在使用它的请求仍持有引用，不受影响。
+
+    只能解析已注册的模型（模型目录中的权重和 extra_paths），
+    不接受任意文件路径，避免客户端让服务端加载（反序列化）任意文件。
+    """
+
+    def __init__(self, models_dir, max_resident=2, loader=None, extra_paths=None):
+        """
+        Args:
+            models_dir: 模型目录
+            max_resident: 最多常驻内存的模型数量
+            loader: 模型加载函数，接收权重路径返回模型对象，默认使用 ultralytics.YOLO
+            extra_paths: 模型目录之外需要注册的权重文件 {名称: 路径}
+        """
+        self.models_dir = models_dir
+        self.max_resident = max(1, int(max_resident))
+        self.loader = loader or self._load_yolo
+        self.extra_paths = dict(extra_paths or {})
+
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._resident = OrderedDict()  # 名称 -> ModelEntry，最久未使用在前
+        self._available = {}
+        self._pinned = None
+        self.evictions = 0
+        self.scan()
+
+    @staticmethod
+    def _load_yolo(path):
+        from ultralytics import YOLO
+        return YOLO(path)
+
+    @staticmethod
+    def model_name(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def scan(self):
+        """扫描模型目录，刷新可用模型列表"""
+        available = {}
+        if os.path.isdir(self.models_dir):
+            filenames = sorted(os.listdir(self.models_dir))
+            for filename in filenames:
+                stem, ext = os.path.splitext(filename)
+                # 与 .pt 同名的 .onnx 是推理后端的导出缓存，不单独注册
+                if ext == '.onnx' and stem + '.pt' in filenames:
+                    continue
+                if ext in MODEL_EXTENSIONS:
+                    path = os.path.join(self.models_dir, filename)
+                    available[self.model_name(path)] = path
+        for name, path in self.extra_paths.items():
+            if not os.path.exists(path):
+                continue
+            if available.setdefault(name, path) != path:
+                logger.warning(f"模型 {path} 与模型目录中的同名模型冲突，未注册")
+
+        with self._lock:
+            self._available = available
+        return self.get_available_models()
+
+    def _find(self, name_or_path):
+        """按名称或已注册的权重路径查找，返回 (名称, 路径) 或 None"""
+        with self._lock:
+            path = self._available.get(name_or_path)
+            if path is not None:
+                return name_or_path, path
+            target = os.path.abspath(name_or_path)
+            for name, path in self._available.items():
+                if os.path.abspath(path) == target:
+                    return name, path
+        return None
+
+    def resolve(self, name_or_path):
+        """将已注册的模型名称或权重路径解析为 (名称, 路径)
+        Raises:
+            KeyError: 模型未注册
+        """
+        found = self._find(name_or_path)
+        if found is None:
+            # 目录可能新增了权重文件，重新扫描一次
+            self.scan()
+            found = self._find(name_or_path)
+        if found is None:
+            raise KeyError(f"模型 {name_or_path} 不存在")
+        return found
+
+    def is_registered(self, name_or_path):
+        """模型名称或权重路径是否已注册"""
+        try:
+            self.resolve(name_or_path)
+        except KeyError:
+            return False
+        return True
+
+    def pin(self, name):
+        """固定当前模型，使其不会被LRU淘汰；同一时间只固定一个模型"""
+        with self._lock:
+            self._pinned = name
+
+    def _lookup_locked(self, name, path, stat_key):
+        """查找常驻模型，权重文件被替换过的条目视为失效"""
+        entry = self._resident.get(name)
+        if entry is None or entry.path != path or entry.stat_key != stat_key:
+            return None
+        self._resident.move_to_end(name)
+        entry.touch()
+        return entry
+
+    def get(self, name_or_path):
+        """获取模型，未常驻或权重文件已更新时加载，并按LRU淘汰多余的模型"""
+        name, path = self.resolve(name_or_path)
+        stat_key = _stat_key(path)
+
+        with self._lock:
+            entry = self._lookup_locked(name, path, stat_key)
+            if entry is not None:
+                return entry
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # 同名模型只加载一次，加载过程不阻塞其他模型的请求
+        with load_lock:
+            with self._lock:
+                entry = self._lookup_locked(name, path, stat_key)
+                if entry is not None:
+                    return entry
+
+            entry = self._load(name, path, stat_key)
+
+            with self._lock:
+                self._resident[name] = entry
+                self._resident.move_to_end(name)
+                while len(self._resident) > self.max_resident:
+                    evicted_name = next((n for n in self._resident if n != self._pinned), None)
+                    if evicted_name is None:
+                        break
+                    del self._resident[evicted_name]
+                    self.evictions += 1
+                    logger.info(f"模型 {evicted_name} 被移出常驻内存")
+                entry.touch()
+        return entry
+
+    def _load(self, name, path, stat_key=None):
+        logger.info(f"正在加载模型: {path}")
+        rss_before = _process_rss()
+        start = time.perf_counter()
+        model = self.loader(path)
+        load_time = time.perf_counter() - start
+        rss_after = _process_rss()
+        rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        entry = ModelEntry(
+            name=name,
+            path=path,
+            model=model,
+            fingerprint=file_fingerprint(path),
+            load_time=load_time,
+            memory_bytes=_model_tensor_bytes(model),
+            rss_delta_bytes=rss_delta,
+            stat_key=stat_key
+        )
+        logger.info(f"模型 {name} 加载成功，耗时 {load_time:.2f}s")
+        return entry
+
+    def is_resident(self, name):
+        with self._lock:
+            return name in self._resident
+
+    def get_available_models(self):
+        with self._lock:
+            available = dict(self._available)
+            resident = set(self._resident)
+        models = {}
+        for name, path in available.items():
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+            models[name] = {
+                'name': name,
+                'path': path,
+                'size': size,
+                'resident': name in resident
+            }
+        return models
+
+    def get_resident_models(self):
+        with self._lock:
+            return {name: entry.to_dict() for name, entry in self._resident.items()}
+
+    def get_status(self):
+        resident = self.get_resident_models()
+        return {
+            'models_dir': self.models_dir,
+            'max_resident': self.max_resident,
+            'pinned_model': self._pinned,
+            'resident_models': resident,
+            'resident_memory_bytes': sum(m['memory_bytes'] or 0 for m in resident.values()),
+            'evictions': self.evictions
+        }
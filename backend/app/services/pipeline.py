@@ -0,0 +1,229 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class Completed:
+    """阶段函数返回该对象时跳过后续阶段，直接以 value 作为流水线结果（如缓存命中）"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class StagePool:
+    """流水线中的一个阶段：有界输入队列 + 固定数量的工作线程
+
+    队列满时 submit 阻塞，下游处理不过来时逐级向上游施加背压，
+    避免已解码的大图在内存中无限堆积。
+    """
+
+    def __init__(self, fn, workers=1, max_queue=8, name='stage'):
+        """
+        Args:
+            fn: 阶段函数，接收单个输入返回输出
+            workers: 工作线程数
+            max_queue: 输入队列容量
+            name: 阶段名称，同时作为线程名前缀
+        """
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._threads = []
+        self._threads_lock = threading.Lock()
+        self._stopped = False
+
+        self._stats_lock = threading.Lock()
+        self._busy = 0
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            'items': 0,
+            'failed': 0,
+            'total_service': 0.0,
+            'max_service': 0.0,
+            'total_queue_wait': 0.0,
+            'max_queue_wait': 0.0,
+            'max_queue_depth': 0
+        }
+
+    def _ensure_workers(self):
+        """按需启动工作线程"""
+        if len(self._threads) == self.workers:
+            return
+        with self._threads_lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item):
+        """提交单个输入，队列满时阻塞，返回 concurrent.futures.Future"""
+        if self._stopped:
+            raise RuntimeError(f"流水线阶段 {self.name} 已停止")
+        self._ensure_workers()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], depth)
+        return future
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            item, future, enqueued = entry
+            start = time.perf_counter()
+            with self._stats_lock:
+                self._busy += 1
+            error = None
+            try:
+                result = self.fn(item)
+            except Exception as e:
+                error = e
+            # 先记录耗时再设置结果：结果回调会把输出提交给下一阶段，可能因背压阻塞
+            self._record(time.perf_counter() - start, start - enqueued, error is not None)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _record(self, service, queue_wait, failed):
+        with self._stats_lock:
+            stats = self._stats
+            self._busy -= 1
+            stats['items'] += 1
+            if failed:
+                stats['failed'] += 1
+            stats['total_service'] += service
+            stats['max_service'] = max(stats['max_service'], service)
+            stats['total_queue_wait'] += queue_wait
+            stats['max_queue_wait'] = max(stats['max_queue_wait'], queue_wait)
+
+    def get_stats(self):
+        """返回队列深度、工作线程占用和单项耗时统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            busy = self._busy
+        items = stats['items']
+        return {
+            'workers': self.workers,
+            'busy_workers': busy,
+            'queue_depth': self._queue.qsize(),
+            'max_queue': self.max_queue,
+            'max_queue_depth': stats['max_queue_depth'],
+            'items': items,
+            'failed': stats['failed'],
+            'avg_service_ms': stats['total_service'] / items * 1000.0 if items else 0.0,
+            'max_service_ms': stats['max_service'] * 1000.0,
+            'avg_queue_wait_ms': stats['total_queue_wait'] / items * 1000.0 if items else 0.0,
+            'max_queue_wait_ms': stats['max_queue_wait'] * 1000.0
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
+
+    def shutdown(self, wait=True):
+        """停止工作线程，已排队的输入会先处理完"""
+        self._stopped = True
+        with self._threads_lock:
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+class Pipeline:
+    """由若干阶段串联的流水线
+
+    每个阶段是带 submit(item) -> Future 接口的执行器（StagePool 或 MicroBatcher），
+    上一阶段完成后在其工作线程中把输出提交给下一阶段。不同输入在各阶段之间重叠执行：
+    一张图像推理的同时，其他图像可以解码或编码。
+    """
+
+    def __init__(self, stages):
+        """
+        Args:
+            stages: [(阶段名称, 执行器)] 列表，按执行顺序排列
+        """
+        self.stages = list(stages)
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    def submit(self, item):
+        """提交一个输入，首个阶段队列满时阻塞，返回最终结果的 Future"""
+        final = Future()
+        with self._stats_lock:
+            self._in_flight += 1
+        self._advance(0, item, final, time.perf_counter())
+        return final
+
+    def __call__(self, item, timeout=None):
+        """同步提交并等待结果"""
+        return self.submit(item).result(timeout=timeout)
+
+    def _advance(self, index, item, final, started):
+        if isinstance(item, Completed):
+            self._finish(final, started, value=item.value)
+            return
+        if index == len(self.stages):
+            self._finish(final, started, value=item)
+            return
+        try:
+            future = self.stages[index][1].submit(item)
+        except Exception as e:
+            self._finish(final, started, error=e)
+            return
+        future.add_done_callback(lambda f: self._on_stage_done(index, f, final, started))
+
+    def _on_stage_done(self, index, future, final, started):
+        error = future.exception()
+        if error is not None:
+            self._finish(final, started, error=error)
+        else:
+            self._advance(index + 1, future.result(), final, started)
+
+    def _finish(self, final, started, value=None, error=None):
+        latency = time.perf_counter() - started
+        with self._stats_lock:
+            self._in_flight -= 1
+            self._completed += 1
+            if error is not None:
+                self._failed += 1
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+        if error is not None:
+            final.set_exception(error)
+        else:
+            final.set_result(value)
+
+    def get_stats(self):
+        """返回各阶段的队列深度与耗时，以及端到端延迟"""
+        with self._stats_lock:
+            completed = self._completed
+            stats = {
+                'in_flight': self._in_flight,
+                'completed': completed,
+                'failed': self._failed,
+                'avg_latency_ms': self._total_latency / completed * 1000.0 if completed else 0.0,
+                'max_latency_ms': self._max_latency * 1000.0
+            }
+        stats['stages'] = {name: stage.get_stats() for name, stage in self.stages}
+        return stats
+
+    def shutdown(self, wait=True):
+        for _, stage in self.stages:
+            stage.shutdown(wait=wait)
@@ -0,0 +1,109 @@
+import threading
+
+import numpy as np
+
+# 未在类别映射中的类别归入“其他”
+OTHER_CATEGORY = '其他'
+
+
+class DetectionPostprocessor:
+    """向量化的检测结果后处理
+
+    按模型的类别表预先计算 类别下标 -> (显示名称, 类别编号, 颜色) 的查找表，
+    整批检测框只做一次数组转换，类别统计使用 np.bincount 完成。
+    """
+
+    def __init__(self, category_mapping, colors, default_color=(0, 0, 255)):
+        """
+        Args:
+            category_mapping: {类别名称: {'name', 'category', 'color'}}
+            colors: {显示名称: 标注颜色}
+            default_color: 未配置颜色的类别使用的颜色
+        """
+        self.category_mapping = category_mapping
+        self.colors = colors
+        self.default_color = tuple(default_color)
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _get_table(self, names):
+        """按模型类别表缓存查找表
+        Args:
+            names: {类别下标: 类别名称}
+        Returns:
+            (显示名称列表, 类别编号数组, 类别名称列表, 颜色列表)，均按类别下标索引
+        """
+        key = tuple(sorted(names.items()))
+        table = self._tables.get(key)
+        if table is not None:
+            return table
+
+        size = max(names) + 1 if names else 0
+        display_names = [None] * size
+        colors = [self.default_color] * size
+        category_codes = np.zeros(size, dtype=np.int64)
+        categories = []
+        category_index = {}
+        for index, class_name in names.items():
+            info = self.category_mapping.get(class_name, {'name': class_name, 'category': OTHER_CATEGORY})
+            display_names[index] = info['name']
+            colors[index] = tuple(self.colors.get(info['name'], self.default_color))
+            if info['category'] not in category_index:
+                category_index[info['category']] = len(categories)
+                categories.append(info['category'])
+            category_codes[index] = category_index[info['category']]
+
+        table = (display_names, category_codes, categories, colors)
+        with self._lock:
+            self._tables[key] = table
+        return table
+
+    @staticmethod
+    def names_to_ids(class_names):
+        """将类别名称列表转换为 (类别下标数组, {下标: 名称})"""
+        names = {i: name for i, name in enumerate(dict.fromkeys(class_names))}
+        lookup = {name: i for i, name in names.items()}
+        return np.array([lookup[name] for name in class_names], dtype=np.int64), names
+
+    def build(self, boxes, confs, class_ids, names):
+        """生成检测结果列表和类别统计
+        Args:
+            boxes: (N, 4) xyxy
+            confs: (N,) 置信度
+            class_ids: (N,) 类别下标
+            names: {类别下标: 类别名称}
+        Returns:
+            (detections, class_counts)，格式与逐框处理的结果一致
+        """
+        display_names, category_codes, categories, colors = self._get_table(names)
+        class_ids = np.asarray(class_ids, dtype=np.int64)
+        if len(class_ids) == 0:
+            return [], {}
+
+        bboxes = np.asarray(boxes).astype(np.int64).tolist()
+        scores = np.asarray(confs, dtype=np.float32).tolist()
+        codes = category_codes[class_ids]
+
+        detections = [
+            {
+                'bbox': bbox,
+                'confidence': score,
+                'class': display_names[class_id],
+                'category': categories[code],
+                'color': colors[class_id]
+            }
+            for bbox, score, class_id, code in zip(bboxes, scores, class_ids.tolist(), codes.tolist())
+        ]
+
+        # 类别统计：计数用 bincount，类别与条目均按首次出现的顺序排列
+        counts = np.bincount(codes, minlength=len(categories))
+        unique_codes, first_code = np.unique(codes, return_index=True)
+        unique_ids, first_id = np.unique(class_ids, return_index=True)
+        class_counts = {}
+        for code in unique_codes[np.argsort(first_code)].tolist():
+            class_counts[categories[code]] = {'count': int(counts[code]), 'items': []}
+        for class_id in unique_ids[np.argsort(first_id)].tolist():
+            items = class_counts[categories[category_codes[class_id]]]['items']
+            if display_names[class_id] not in items:
+                items.append(display_names[class_id])
+        return detections, class_counts
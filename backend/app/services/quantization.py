@@ -0,0 +1,146 @@
+import os
+import re
+import glob
+import hashlib
+import logging
+
+import cv2
+
+from backend.app.services.inference_backends import export_model, preprocess
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+CALIBRATION_METHODS = ('minmax', 'entropy', 'percentile')
+
+# 检测头中参与解码的节点（DFL、按步长缩放、拼接输出）对量化误差敏感，保持FP32；
+# 检测头的卷积分支 cv2（回归）/cv3（分类）仍然量化
+_HEAD_BRANCHES = ('/cv2', '/cv3')
+
+
+def split_dataset(image_dir, val_fraction=0.2):
+    """按文件名哈希把图像目录稳定地划分为训练/验证两部分
+
+    同一文件始终落在同一侧，新增图像不会打乱已有划分，校准集取自训练部分，与验证集不重叠。
+    Returns:
+        (训练图像路径列表, 验证图像路径列表)
+    """
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(image_dir, pattern)))
+    train, val = [], []
+    for path in sorted(paths):
+        digest = hashlib.md5(os.path.basename(path).encode('utf-8')).hexdigest()
+        (val if int(digest[:8], 16) / 0xFFFFFFFF < val_fraction else train).append(path)
+    return train, val
+
+
+class ImageCalibrationReader:
+    """逐张读取校准图像，按推理时相同的 letterbox 预处理后交给 ONNX Runtime 统计激活范围"""
+
+    def __init__(self, paths, input_name, imgsz=640):
+        self.paths = list(paths)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._iter = iter(self.paths)
+
+    def get_next(self):
+        for path in self._iter:
+            img = cv2.imread(path)
+            if img is None:
+                logger.warning(f"跳过无法读取的校准图像: {path}")
+                continue
+            batch, _ = preprocess([img], self.imgsz)
+            return {self.input_name: batch}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.paths)
+
+
+def _head_nodes_to_exclude(model):
+    """返回最后一个模块（检测头）中除卷积分支外的节点名"""
+    pattern = re.compile(r'^/model\.(\d+)/')
+    indices = [int(m.group(1)) for m in (pattern.match(node.name) for node in model.graph.node) if m]
+    if not indices:
+        return []
+    prefix = f"/model.{max(indices)}/"
+    return [node.name for node in model.graph.node
+            if node.name.startswith(prefix) and not node.name[len(prefix) - 1:].startswith(_HEAD_BRANCHES)]
+
+
+def quantize_int8(weights_path, calibration_paths, output_path=None, imgsz=640, method='minmax',
+                  per_channel=True, exclude_head=True):
+    """对 .pt 权重做静态INT8训练后量化，输出可由 DetectionService 直接加载的 ONNX 模型
+
+    先导出FP32 ONNX（复用推理后端的导出缓存），再用校准图像统计各层激活范围，
+    生成 QDQ 格式的INT8模型（激活 uint8、权重 int8），在支持VNNI的x86 CPU上执行INT8卷积。
+    Args:
+        weights_path: 训练得到的 .pt 权重
+        calibration_paths: 校准图像路径列表，一般取训练集中的几十到几百张
+        output_path: 输出路径，默认为权重旁的 <名称>_int8.onnx
+        imgsz: 校准输入尺寸，应与推理时的 DETECTION_IMGSZ 一致
+        method: 校准方法 minmax / entropy / percentile
+        per_channel: 权重是否按输出通道量化（精度更高）
+        exclude_head: 检测头的解码部分是否保持FP32
+    Returns:
+        INT8 ONNX 模型路径
+    """
+    if method not in CALIBRATION_METHODS:
+        raise ValueError(f"不支持的校准方法: {method}")
+    if not calibration_paths:
+        raise ValueError("校准图像为空")
+
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    fp32_path = export_model(weights_path, 'onnx', imgsz)
+    if output_path is None:
+        output_path = os.path.splitext(weights_path)[0] + '_int8.onnx'
+
+    model_input = fp32_path
+    try:
+        # 符号形状推断和图优化使量化节点的位置更合理，失败时直接量化原模型
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        model_input = os.path.splitext(output_path)[0] + '_prep.onnx'
+        quant_pre_process(fp32_path, model_input)
+    except Exception as e:
+        logger.warning(f"量化预处理失败，直接量化导出模型: {str(e)}")
+        model_input = fp32_path
+
+    fp32_model = onnx.load(fp32_path)
+    nodes_to_exclude = _head_nodes_to_exclude(onnx.load(model_input)) if exclude_head else []
+    reader = ImageCalibrationReader(calibration_paths, fp32_model.graph.input[0].name, imgsz)
+
+    logger.info(f"开始INT8静态量化: {len(calibration_paths)} 张校准图像, 校准方法 {method}, "
+                f"保持FP32的检测头节点 {len(nodes_to_exclude)} 个")
+    try:
+        quantize_static(
+            model_input,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method={
+                'minmax': CalibrationMethod.MinMax,
+                'entropy': CalibrationMethod.Entropy,
+                'percentile': CalibrationMethod.Percentile
+            }[method],
+            nodes_to_exclude=nodes_to_exclude
+        )
+    finally:
+        if model_input != fp32_path and os.path.exists(model_input):
+            os.remove(model_input)
+
+    # 保留导出时写入的类别名称等元数据，加载时据此还原 names
+    int8_model = onnx.load(output_path)
+    existing = {prop.key for prop in int8_model.metadata_props}
+    missing = [prop for prop in fp32_model.metadata_props if prop.key not in existing]
+    if missing:
+        int8_model.metadata_props.extend(missing)
+        onnx.save(int8_model, output_path)
+
+    logger.info(f"INT8模型已保存: {output_path}")
+    return output_path
@@ -0,0 +1,385 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+META_SUFFIX = '.json'
+BLOB_SUFFIX = '.bin'
+USAGE_FILE = '.usage'
+LOCK_FILE = '.lock'
+
+
+class ResultCache:
+    """内容寻址的检测结果缓存
+
+    - 按缓存键前缀分片存储: <cache_dir>/<k[0:2]>/<k[2:4]>/<key>.json|.bin
+    - 元数据(检测结果)为紧凑JSON，标注图像作为独立的二进制文件存储
+    - 每个条目可带一个标签（如模型版本指纹），支持按标签选择性失效
+    - 内存索引保存所有条目的元数据，命中时无需读取元数据文件；索引中没有的键
+      回退到磁盘查找，多个进程（如 gunicorn 工作进程）共用同一缓存目录时互相可见
+    - 目录的总字节数记录在 <cache_dir>/.usage 中，由文件锁串行更新，字节预算按
+      所有进程的总占用计算，超出时按 LRU 或 LFU 策略淘汰本进程索引中的条目
+    """
+
+    POLICIES = ('lru', 'lfu')
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024, policy='lru'):
+        """
+        Args:
+            cache_dir: 缓存根目录
+            max_bytes: 缓存占用的字节预算
+            policy: 淘汰策略，'lru' 或 'lfu'
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"不支持的缓存淘汰策略: {policy}")
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self.policy = policy
+
+        self._lock = threading.Lock()
+        # key -> {'meta': dict, 'tag': str, 'size': int, 'has_blob': bool, 'hits': int}
+        # OrderedDict 的顺序即访问顺序（最旧在前）
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'puts': 0, 'evictions': 0, 'errors': 0}
+        self._usage_path = os.path.join(cache_dir, USAGE_FILE)
+        self._usage_lock_path = os.path.join(cache_dir, LOCK_FILE)
+        self._usage_thread_lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _shard_dir(self, key):
+        return os.path.join(self.cache_dir, key[0:2], key[2:4])
+
+    def _paths(self, key):
+        shard = self._shard_dir(key)
+        return os.path.join(shard, key + META_SUFFIX), os.path.join(shard, key + BLOB_SUFFIX)
+
+    def _read_entry(self, key):
+        """从磁盘读取条目，返回索引项，不存在或损坏时返回 None"""
+        meta_path, blob_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                envelope = json.load(f)
+            size = os.path.getsize(meta_path)
+            has_blob = os.path.exists(blob_path)
+            if has_blob:
+                size += os.path.getsize(blob_path)
+            return {'meta': envelope['meta'], 'tag': envelope.get('tag'), 'size': size,
+                    'has_blob': has_blob, 'hits': 0, 'mtime': os.path.getmtime(meta_path)}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"跳过损坏的缓存条目 {key}: {str(e)}")
+            self._delete_files([key])
+            return None
+
+    def _scan(self):
+        """扫描分片目录，返回按修改时间排序的 [(键, 索引项)]"""
+        entries = []
+        for level1 in os.listdir(self.cache_dir):
+            dir1 = os.path.join(self.cache_dir, level1)
+            if len(level1) != 2 or not os.path.isdir(dir1):
+                continue
+            for level2 in os.listdir(dir1):
+                dir2 = os.path.join(dir1, level2)
+                if not os.path.isdir(dir2):
+                    continue
+                for name in os.listdir(dir2):
+                    if not name.endswith(META_SUFFIX):
+                        continue
+                    key = name[:-len(META_SUFFIX)]
+                    entry = self._read_entry(key)
+                    if entry is not None:
+                        entries.append((key, entry))
+        entries.sort(key=lambda item: item[1]['mtime'])
+        return entries
+
+    def _load_index(self):
+        """启动时扫描分片目录重建内存索引，按修改时间恢复访问顺序，并以实际占用校准字节用量"""
+        entries = self._scan()
+        with self._lock:
+            for key, entry in entries:
+                self._index[key] = entry
+                self._bytes += entry['size']
+        with self._usage_locked():
+            self._write_usage(sum(entry['size'] for _, entry in entries))
+
+        with self._lock:
+            self._evict_locked()
+        logger.info(f"结果缓存索引已加载: {len(self._index)} 条, {self._bytes} 字节")
+
+    @contextmanager
+    def _usage_locked(self):
+        """跨进程互斥地访问字节用量文件
+
+        每次重新打开锁文件：fork 出的子进程共享父进程已打开的文件描述，
+        在同一描述上加 flock 无法互斥。
+        """
+        with self._usage_thread_lock:
+            with open(self._usage_lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _read_usage(self):
+        try:
+            with open(self._usage_path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_usage(self, value):
+        self._atomic_write(self._usage_path, str(max(0, int(value))).encode('ascii'))
+
+    def _usage(self):
+        """所有进程写入的缓存条目总字节数"""
+        with self._usage_locked():
+            return self._read_usage()
+
+    def _disk_size(self, key):
+        size = 0
+        for path in self._paths(key):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _delete_files(self, keys):
+        """删除条目文件，按实际删除的字节数扣减总用量（其他进程可能已删除同一条目）"""
+        with self._usage_locked():
+            removed = sum(self._remove_files(key) for key in keys)
+            if removed:
+                self._write_usage(self._read_usage() - removed)
+
+    def _remove_files(self, key):
+        """删除条目文件，返回实际删除的字节数"""
+        removed = 0
+        for path in self._paths(key):
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                removed += size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除缓存文件失败 {path}: {str(e)}")
+        return removed
+
+    @staticmethod
+    def _atomic_write(path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key, refresh=False):
+        """查找缓存
+        Args:
+            key: 缓存键
+            refresh: 为 True 时忽略内存索引，从磁盘重新读取（条目可能已被其他进程更新）
+        Returns:
+            (meta, blob) 元组，未命中时返回 None。meta 为共享的索引对象，调用方不应修改
+        """
+        with self._lock:
+            if refresh:
+                stale = self._index.pop(key, None)
+                if stale is not None:
+                    self._bytes -= stale['size']
+            entry = self._index.get(key)
+            if entry is not None:
+                self._index.move_to_end(key)
+                entry['hits'] += 1
+        if entry is None:
+            # 其他进程写入的条目不在本进程的索引中，回退到磁盘查找并加入索引
+            entry = self._read_entry(key)
+            with self._lock:
+                if entry is None:
+                    self._stats['misses'] += 1
+                    return None
+                if key not in self._index:
+                    self._index[key] = entry
+                    self._bytes += entry['size']
+                entry = self._index[key]
+                entry['hits'] += 1
+        meta = entry['meta']
+        has_blob = entry['has_blob']
+
+        blob = None
+        if has_blob:
+            _, blob_path = self._paths(key)
+            try:
+                with open(blob_path, 'rb') as f:
+                    blob = f.read()
+            except OSError as e:
+                logger.warning(f"读取缓存图像失败 {key}: {str(e)}")
+                self.delete(key)
+                with self._lock:
+                    self._stats['errors'] += 1
+                    self._stats['misses'] += 1
+                return None
+
+        with self._lock:
+            self._stats['hits'] += 1
+        return meta, blob
+
+    def put(self, key, meta, blob=None, tag=None):
+        """写入缓存
+        Args:
+            key: 缓存键（十六进制字符串）
+            meta: 可JSON序列化的元数据
+            blob: 可选的二进制数据（如编码后的标注图像）
+            tag: 可选的条目标签，用于按标签失效
+        """
+        envelope = {'tag': tag, 'meta': meta}
+        meta_bytes = json.dumps(envelope, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        size = len(meta_bytes) + (len(blob) if blob is not None else 0)
+        if size > self.max_bytes:
+            logger.warning(f"缓存条目 {key} 大小 {size} 超过缓存预算，跳过缓存")
+            return False
+
+        meta_path, blob_path = self._paths(key)
+        # 写入和用量更新在同一把跨进程锁内完成，按写入前后的实际大小计算增量，
+        # 多个进程写入同一条目时不会重复计算
+        with self._usage_locked():
+            old_size = self._disk_size(key)
+            try:
+                os.makedirs(self._shard_dir(key), exist_ok=True)
+                if blob is not None:
+                    self._atomic_write(blob_path, blob)
+                elif os.path.exists(blob_path):
+                    os.remove(blob_path)
+                self._atomic_write(meta_path, meta_bytes)
+                error = None
+            except OSError as e:
+                error = e
+            self._write_usage(self._read_usage() + self._disk_size(key) - old_size)
+        if error is not None:
+            logger.error(f"写入缓存失败 {key}: {str(error)}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return False
+
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._bytes -= old['size']
+            self._index[key] = {'meta': meta, 'tag': tag, 'size': size, 'has_blob': blob is not None, 'hits': 0}
+            self._bytes += size
+            self._stats['puts'] += 1
+            self._evict_locked(protect=key)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry['size']
+        self._delete_files([key])
+        return entry is not None
+
+    def invalidate(self, tag):
+        """删除指定标签下的全部条目（包括其他进程写入的条目），返回删除数量"""
+        keys = {key for key, entry in self._scan() if entry['tag'] == tag}
+        with self._lock:
+            keys.update(key for key, entry in self._index.items() if entry['tag'] == tag)
+            for key in keys:
+                entry = self._index.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry['size']
+        self._delete_files(keys)
+        return len(keys)
+
+    def get_tag_stats(self):
+        """按标签统计条目数与字节数"""
+        tags = {}
+        with self._lock:
+            for entry in self._index.values():
+                tag_stats = tags.setdefault(entry['tag'] or 'untagged', {'entries': 0, 'bytes': 0})
+                tag_stats['entries'] += 1
+                tag_stats['bytes'] += entry['size']
+        return tags
+
+    def clear(self):
+        """删除全部条目（包括其他进程写入的条目），返回删除数量"""
+        keys = {key for key, _ in self._scan()}
+        with self._lock:
+            keys.update(self._index.keys())
+            self._index.clear()
+            self._bytes = 0
+        self._delete_files(keys)
+        return len(keys)
+
+    def _select_victim(self, protect=None):
+        if self.policy == 'lfu':
+            # 命中次数最少者优先淘汰，次数相同时淘汰最久未访问的
+            victim, victim_hits = None, None
+            for key, entry in self._index.items():
+                if key == protect:
+                    continue
+                if victim_hits is None or entry['hits'] < victim_hits:
+                    victim, victim_hits = key, entry['hits']
+            return victim
+        for key in self._index:
+            if key != protect:
+                return key
+        return None
+
+    def _evict_locked(self, protect=None):
+        """在持有锁的情况下淘汰本进程索引中的条目，直到所有进程的总占用满足字节预算"""
+        while self._index and self._usage() > self.max_bytes:
+            victim = self._select_victim(protect)
+            if victim is None:
+                break
+            entry = self._index.pop(victim)
+            self._bytes -= entry['size']
+            self._stats['evictions'] += 1
+            self._delete_files([victim])
+
+    def get_tag(self, key):
+        """返回条目的标签，不存在时返回 None"""
+        with self._lock:
+            entry = self._index.get(key)
+            return entry['tag'] if entry is not None else None
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._index:
+                return True
+        return os.path.exists(self._paths(key)[0])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
+
+    def get_stats(self):
+        """返回命中、未命中、淘汰等统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._index)
+            local_bytes = self._bytes
+        used = self._usage()
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': entries,
+            'bytes': used,
+            'local_bytes': local_bytes,
+            'max_bytes': self.max_bytes,
+            'usage': used / self.max_bytes if self.max_bytes else 0.0,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+            'policy': self.policy,
+            'timestamp': time.time()
+        })
+        return stats
@@ -0,0 +1,90 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def detections_fingerprint(detections):
+    """检测结果的规范化哈希
+
+    只取规则检查用到的类别和检测框，保持原始顺序（规则消息报告的是按顺序最先发现的目标），
+    置信度、颜色等字段的变化不影响指纹。
+    """
+    canonical = json.dumps([[d['class'], [float(v) for v in d['bbox']]] for d in detections],
+                           ensure_ascii=False, separators=(',', ':'))
+    return hashlib.md5(canonical.encode('utf-8')).hexdigest()
+
+
+class RuleResultCache:
+    """按 (检测结果指纹, 规则指纹) 缓存单条规则结果的内存LRU缓存
+
+    规则指纹由规则定义的内容计算，规则文件修改后只有内容变化的规则缓存失效，
+    其余规则的结果继续命中。
+    """
+
+    def __init__(self, max_entries=4096):
+        """
+        Args:
+            max_entries: 最多缓存的单条规则结果数，0 为不缓存
+        """
+        self.max_entries = max(0, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._rule_stats = {}
+
+    def get(self, fingerprint, rule_id, rule_fingerprint):
+        """命中时返回 {'status':..., 'message':...}，否则返回 None"""
+        if not self.max_entries:
+            return None
+        key = (fingerprint, rule_fingerprint)
+        with self._lock:
+            result = self._entries.get(key)
+            stats = self._rule_stats.setdefault(rule_id, {'hits': 0, 'misses': 0})
+            if result is None:
+                self._misses += 1
+                stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            stats['hits'] += 1
+            return result
+
+    def put(self, fingerprint, rule_fingerprint, result):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[(fingerprint, rule_fingerprint)] = result
+            self._entries.move_to_end((fingerprint, rule_fingerprint))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+        return count
+
+    def get_stats(self):
+        """返回总体与各规则的命中率"""
+        with self._lock:
+            hits, misses = self._hits, self._misses
+            rules = {rule_id: dict(stats) for rule_id, stats in self._rule_stats.items()}
+            entries = len(self._entries)
+            evictions = self._evictions
+        for stats in rules.values():
+            total = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / total if total else 0.0
+        total = hits + misses
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'evictions': evictions,
+            'rules': rules
+        }
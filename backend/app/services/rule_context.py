@@ -0,0 +1,119 @@
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+
+class RuleContext:
+    """一次规则检查共享的检测结果上下文
+
+    检测结果只按类别分组一次，几何对象（检测框多边形、中心点）和空间索引按需创建并缓存，
+    所有规则共用，"临近/包含/相交"查询先用 STRtree 按外接矩形筛选候选，再精确计算距离。
+    选择结果始终保持检测结果的原始顺序，与逐条遍历的判定顺序一致。
+    """
+
+    def __init__(self, detections):
+        """
+        Args:
+            detections: 检测结果列表，每项至少包含 'class' 和 'bbox' [x1, y1, x2, y2]
+        """
+        self.detections = detections
+        self._groups = {}
+        for index, detection in enumerate(detections):
+            self._groups.setdefault(detection['class'], []).append(index)
+        self._selections = {}
+        self._polygons = {}
+        self._centers = {}
+        self._trees = {}
+        self._boxes = {}
+        self._memo = {}
+
+    @staticmethod
+    def _key(classes):
+        return (classes,) if isinstance(classes, str) else tuple(classes)
+
+    def indices(self, classes):
+        """返回属于给定类别（单个类别名或类别名列表）的检测序号，按原始顺序排列"""
+        key = self._key(classes)
+        selection = self._selections.get(key)
+        if selection is None:
+            if len(key) == 1:
+                selection = self._groups.get(key[0], [])
+            else:
+                selection = sorted(i for name in set(key) for i in self._groups.get(name, []))
+            self._selections[key] = selection
+        return selection
+
+    def select(self, classes):
+        """返回属于给定类别的检测结果列表"""
+        return [self.detections[i] for i in self.indices(classes)]
+
+    def count(self, classes):
+        return len(self.indices(classes))
+
+    def boxes(self, classes):
+        """给定类别检测框的 (N,4) float64 数组，按原始顺序排列"""
+        key = self._key(classes)
+        boxes = self._boxes.get(key)
+        if boxes is None:
+            boxes = np.array([self.detections[i]['bbox'] for i in self.indices(key)],
+                             dtype=np.float64).reshape(-1, 4)
+            self._boxes[key] = boxes
+        return boxes
+
+    def polygon(self, index):
+        """第 index 个检测框的多边形"""
+        polygon = self._polygons.get(index)
+        if polygon is None:
+            x1, y1, x2, y2 = self.detections[index]['bbox']
+            polygon = shapely.box(x1, y1, x2, y2, ccw=False)
+            self._polygons[index] = polygon
+        return polygon
+
+    def center(self, index):
+        """第 index 个检测框的中心点"""
+        center = self._centers.get(index)
+        if center is None:
+            x1, y1, x2, y2 = self.detections[index]['bbox']
+            center = shapely.Point((x1 + x2) / 2, (y1 + y2) / 2)
+            self._centers[index] = center
+        return center
+
+    def centers_xy(self, indices):
+        """返回 (xs, ys) 中心点坐标数组"""
+        boxes = np.array([self.detections[i]['bbox'] for i in indices], dtype=np.float64).reshape(-1, 4)
+        return (boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2
+
+    def tree(self, classes):
+        """给定类别检测框的 STRtree，查询结果为 indices(classes) 中的位置"""
+        key = self._key(classes)
+        tree = self._trees.get(key)
+        if tree is None:
+            tree = STRtree([self.polygon(i) for i in self.indices(key)])
+            self._trees[key] = tree
+        return tree
+
+    def query_bounds(self, classes, bounds):
+        """返回外接矩形与 bounds (minx, miny, maxx, maxy) 相交（含边界接触）的检测序号，按原始顺序排列"""
+        selection = self.indices(classes)
+        if not selection:
+            return []
+        positions = self.tree(classes).query(shapely.box(*bounds))
+        return [selection[p] for p in sorted(positions)]
+
+    def near(self, classes, geometry, distance):
+        """返回与 geometry 距离小于 distance 的检测序号，按原始顺序排列"""
+        minx, miny, maxx, maxy = geometry.bounds
+        candidates = self.query_bounds(classes, (minx - distance, miny - distance, maxx + distance, maxy + distance))
+        return [i for i in candidates if self.polygon(i).distance(geometry) < distance]
+
+    def any_near(self, classes, geometry, distance):
+        """是否存在与 geometry 距离小于 distance 的检测框"""
+        minx, miny, maxx, maxy = geometry.bounds
+        candidates = self.query_bounds(classes, (minx - distance, miny - distance, maxx + distance, maxy + distance))
+        return any(self.polygon(i).distance(geometry) < distance for i in candidates)
+
+    def memo(self, key, compute):
+        """按 key 缓存一次检查内可被多条规则共享的计算结果"""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
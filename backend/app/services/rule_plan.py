@@ -0,0 +1,288 @@
+import json
+import hashlib
+import logging
+
+import numpy as np
+import shapely
+
+from backend.app.services.box_ops import box_centers, box_corners, pairwise_distances, points_in_circles
+
+logger = logging.getLogger(__name__)
+
+RULE_OUTCOMES = ('pass', 'fail')
+
+
+class RuleDefinitionError(Exception):
+    """规则文件内容不合法"""
+
+
+def _selector(value, field):
+    """类别选择器：单个类别名或类别名列表，统一为元组"""
+    if isinstance(value, str):
+        return (value,)
+    if isinstance(value, list) and value and all(isinstance(v, str) for v in value):
+        return tuple(value)
+    raise RuleDefinitionError(f"{field} 应为类别名或类别名列表: {value!r}")
+
+
+class _Counts:
+    """消息模板中的 {count[类别]}，按需从上下文取数量"""
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def __getitem__(self, name):
+        return self.ctx.count(name)
+
+
+# ---------------------------------------------------------------------------
+# 共享几何计算：结果按参数缓存在 RuleContext 中，参数相同的规则只计算一次
+# ---------------------------------------------------------------------------
+
+def _near_hits(ctx, subject, geometry, obj, distance):
+    """每个主体最先（按原始顺序）与之距离小于 distance 的对象检测序号，没有时为 None"""
+    def compute():
+        hits = []
+        for index in ctx.indices(subject):
+            shape = ctx.center(index) if geometry == 'center' else ctx.polygon(index)
+            near = ctx.near(obj, shape, distance)
+            hits.append(near[0] if near else None)
+        return hits
+    return ctx.memo(('near', subject, geometry, obj, distance), compute)
+
+
+def _near_sets(ctx, link, endpoint, distance):
+    """与任一端点中心距离小于 distance 的连接对象检测序号集合"""
+    def compute():
+        linked = set()
+        for index in ctx.indices(endpoint):
+            linked.update(ctx.near(link, ctx.center(index), distance))
+        return linked
+    return ctx.memo(('linked', link, endpoint, distance), compute)
+
+
+def _coverage(ctx, subject, dimension, scale, obj, target):
+    """(对象, 主体) 覆盖矩阵：对象的中心或全部角点位于主体中心为圆心的覆盖圆内"""
+    def compute():
+        subjects, objects = ctx.boxes(subject), ctx.boxes(obj)
+        width, height = subjects[:, 2] - subjects[:, 0], subjects[:, 3] - subjects[:, 1]
+        radius = (width if dimension == 'width' else np.maximum(width, height)) * scale
+        if target == 'center':
+            distance = pairwise_distances(box_centers(objects)[:, None], box_centers(subjects)[None, :])
+            return distance <= radius[None, :]
+        return points_in_circles(box_corners(objects), box_centers(subjects), radius).all(axis=2)
+    return ctx.memo(('coverage', subject, dimension, scale, obj, target), compute)
+
+
+# ---------------------------------------------------------------------------
+# 判定类型：返回 (是否通过, 消息模板字段)
+# ---------------------------------------------------------------------------
+
+def _check_exists(ctx, spec):
+    """存在性规则：前置条件已检查所需类别，直接通过"""
+    return True, {}
+
+
+def _check_near(ctx, spec):
+    """主体（中心点或检测框）与对象的距离小于阈值；any 为任一主体满足，all 为全部主体满足"""
+    hits = _near_hits(ctx, spec['subject'], spec['subject_geometry'], spec['object'], spec['distance'])
+    satisfied = [hit is not None for hit in hits]
+    return (any(satisfied) if spec['quantifier'] == 'any' else all(satisfied)), {}
+
+
+def _check_far(ctx, spec):
+    """所有主体与对象的距离均不小于阈值，不通过时 {object_class} 为最先发现的过近对象类别"""
+    hits = _near_hits(ctx, spec['subject'], spec['subject_geometry'], spec['object'], spec['distance'])
+    for hit in hits:
+        if hit is not None:
+            return False, {'object_class': ctx.detections[hit]['class']}
+    return True, {}
+
+
+def _check_adjacent(ctx, spec):
+    """主体中心点位于对象检测框按主体尺寸向外扩展后的范围内
+
+    等价于以主体中心为中心、主体宽高为半宽高的矩形与对象检测框相交，由空间索引直接查询。
+    """
+    def compute():
+        boxes = ctx.boxes(spec['subject'])
+        centers = box_centers(boxes)
+        sizes = boxes[:, 2:] - boxes[:, :2]
+        return [bool(ctx.query_bounds(spec['object'], (x - w, y - h, x + w, y + h)))
+                for (x, y), (w, h) in zip(centers.tolist(), sizes.tolist())]
+    satisfied = ctx.memo(('adjacent', spec['subject'], spec['object']), compute)
+    return (any(satisfied) if spec['quantifier'] == 'any' else all(satisfied)), {}
+
+
+def _check_connects(ctx, spec):
+    """存在一个连接对象（如道路）同时临近每一类端点（如大门和楼梯）的中心点"""
+    linked = None
+    for endpoint in spec['endpoints']:
+        near = _near_sets(ctx, spec['link'], (endpoint,), spec['distance'])
+        linked = near if linked is None else linked & near
+    return bool(linked), {}
+
+
+def _check_covers(ctx, spec):
+    """主体覆盖圆（半径 = 宽度或最长边 x scale）覆盖对象；any 为任一对主体/对象，all 为每个对象都被某个主体覆盖"""
+    covered = _coverage(ctx, spec['subject'], spec['radius']['dimension'], spec['radius']['scale'],
+                        spec['object'], spec['target'])
+    if spec['quantifier'] == 'any':
+        return bool(covered.any()), {}
+    return bool(covered.any(axis=1).all()), {}
+
+
+def _check_inside(ctx, spec):
+    """其余检测框的中心点都位于容器（第一个容器类检测框）内部，不通过时 {object_class} 为最先发现的越界类别"""
+    container = ctx.polygon(ctx.indices(spec['container'])[0])
+    others = [i for i, detection in enumerate(ctx.detections) if detection['class'] not in spec['container']]
+    xs, ys = ctx.centers_xy(others)
+    outside = np.flatnonzero(~shapely.contains_xy(container, xs, ys))
+    if len(outside):
+        return False, {'object_class': ctx.detections[others[outside[0]]]['class']}
+    return True, {}
+
+
+# 判定类型 -> (判定函数, 必填字段, 类别选择器字段, 默认值)
+CHECK_TYPES = {
+    'exists': (_check_exists, (), (), {}),
+    'near': (_check_near, ('subject', 'object', 'distance'), ('subject', 'object'),
+             {'subject_geometry': 'center', 'quantifier': 'any'}),
+    'far': (_check_far, ('subject', 'object', 'distance'), ('subject', 'object'),
+            {'subject_geometry': 'box'}),
+    'adjacent': (_check_adjacent, ('subject', 'object'), ('subject', 'object'), {'quantifier': 'any'}),
+    'connects': (_check_connects, ('link', 'endpoints', 'distance'), ('link', 'endpoints'), {}),
+    'covers': (_check_covers, ('subject', 'object', 'radius'), ('subject', 'object'),
+               {'target': 'center', 'quantifier': 'any'}),
+    'inside': (_check_inside, ('container',), ('container',), {})
+}
+
+
+class CompiledRule:
+    """编译后的单条规则"""
+
+    def __init__(self, definition, check, spec, requires, outcomes):
+        self.id = definition['id']
+        self.category = definition.get('category', '')
+        self.description = definition.get('description', '')
+        self.severity = definition.get('severity', '一般')
+        self.check = check
+        self.spec = spec
+        self.requires = requires
+        self.outcomes = outcomes
+        # 规则定义的内容指纹，规则修改后指纹随之变化
+        canonical = json.dumps(definition, ensure_ascii=False, sort_keys=True)
+        self.fingerprint = hashlib.md5(canonical.encode('utf-8')).hexdigest()
+
+    def evaluate(self, ctx):
+        """返回 {'status':..., 'message':...}"""
+        for classes, status, message in self.requires:
+            if not all(ctx.count(name) for name in classes):
+                return {'status': status, 'message': message.format(count=_Counts(ctx))}
+        if self.spec is None:
+            # method 类型：规则检查器上的自定义检查方法
+            return self.check(ctx)
+        passed, fields = self.check(ctx, self.spec)
+        status, message = self.outcomes['pass' if passed else 'fail']
+        return {'status': status, 'message': message.format(count=_Counts(ctx), **fields)}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'category': self.category,
+            'description': self.description,
+            'severity': self.severity,
+            'fingerprint': self.fingerprint
+        }
+
+
+class RulePlan:
+    """由规则文件编译得到的评估计划
+
+    编译时校验全部规则、统一类别选择器，并统计各规则用到的类别选择器和几何计算；
+    评估时先在一次遍历中完成所有类别分组，参数相同的几何计算（如"中心点到道路的距离"）
+    在同一次检查中只计算一次，供所有规则共享。
+    """
+
+    def __init__(self, rules, selectors, version):
+        self.rules = rules
+        self.selectors = selectors
+        self.version = version
+
+    @classmethod
+    def compile(cls, rule_book, methods=None):
+        """
+        Args:
+            rule_book: 规则文件内容 {'rules': [...]}
+            methods: 可选的 {方法名: 函数}，供 check.type 为 method 的规则引用自定义检查
+        Raises:
+            RuleDefinitionError: 规则定义不合法
+        """
+        rules, selectors, seen = [], {}, set()
+        for definition in rule_book.get('rules', []):
+            rule_id = definition.get('id')
+            if not rule_id or rule_id in seen:
+                raise RuleDefinitionError(f"规则编号缺失或重复: {rule_id!r}")
+            seen.add(rule_id)
+            if not definition.get('enabled', True):
+                continue
+
+            requires = []
+            for item in definition.get('requires', []):
+                classes = _selector(item.get('classes'), f"{rule_id}.requires.classes")
+                requires.append((classes, item['status'], item['message']))
+                for name in classes:
+                    selectors[(name,)] = True
+
+            check_def = dict(definition.get('check') or {})
+            check_type = check_def.pop('type', None)
+            if check_type == 'method':
+                name = check_def.get('name')
+                if not methods or name not in methods:
+                    raise RuleDefinitionError(f"规则 {rule_id} 引用了不存在的检查方法: {name!r}")
+                rules.append(CompiledRule(definition, methods[name], None, requires, {}))
+                continue
+            if check_type not in CHECK_TYPES:
+                raise RuleDefinitionError(f"规则 {rule_id} 的检查类型不支持: {check_type!r}")
+
+            check, required, selector_fields, defaults = CHECK_TYPES[check_type]
+            missing = [field for field in required if field not in check_def]
+            if missing:
+                raise RuleDefinitionError(f"规则 {rule_id} 缺少字段: {', '.join(missing)}")
+            spec = dict(defaults, **check_def)
+            for field in selector_fields:
+                if field == 'endpoints':
+                    spec[field] = _selector(spec[field], f"{rule_id}.check.{field}")
+                    for name in spec[field]:
+                        selectors[(name,)] = True
+                else:
+                    spec[field] = _selector(spec[field], f"{rule_id}.check.{field}")
+                    selectors[spec[field]] = True
+
+            outcomes = {}
+            for outcome in RULE_OUTCOMES:
+                if outcome in definition:
+                    outcomes[outcome] = (definition[outcome]['status'], definition[outcome]['message'])
+            if 'pass' not in outcomes or (check_type != 'exists' and 'fail' not in outcomes):
+                raise RuleDefinitionError(f"规则 {rule_id} 缺少 pass/fail 结果定义")
+            rules.append(CompiledRule(definition, check, spec, requires, outcomes))
+
+        canonical = json.dumps(rule_book, ensure_ascii=False, sort_keys=True)
+        version = hashlib.md5(canonical.encode('utf-8')).hexdigest()
+        logger.info(f"规则编译完成: {len(rules)} 条规则, {len(selectors)} 个共享类别选择器")
+        return cls(rules, list(selectors), version)
+
+    @classmethod
+    def load(cls, path, methods=None):
+        """从 JSON 规则文件编译评估计划"""
+        with open(path, encoding='utf-8') as f:
+            try:
+                rule_book = json.load(f)
+            except json.JSONDecodeError as e:
+                raise RuleDefinitionError(f"规则文件 {path} 格式错误: {str(e)}")
+        return cls.compile(rule_book, methods)
+
+    def prepare(self, ctx):
+        """一次性建立所有规则用到的类别选择"""
+        for selector in self.selectors:
+            ctx.indices(selector)
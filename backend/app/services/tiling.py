@@ -0,0 +1,115 @@
+import logging
+
+import numpy as np
+
+from backend.app.services.box_ops import result_to_arrays, nms
+
+logger = logging.getLogger(__name__)
+
+
+def iter_tiles(width, height, tile_size, overlap):
+    """按行生成覆盖整张图像的切片窗口 (x1, y1, x2, y2)
+
+    相邻切片重叠 overlap 像素，最后一行/列向内对齐，保证切片尺寸一致。
+    """
+    stride = max(1, tile_size - overlap)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    for y in starts(height):
+        for x in starts(width):
+            yield x, y, min(x + tile_size, width), min(y + tile_size, height)
+
+
+class TiledDetector:
+    """切片推理
+
+    超大图纸按固定尺寸、带重叠地切片，切片以批为单位送入模型，
+    局部坐标映射回全图后使用跨切片NMS合并。切片以生成器方式流式产生，
+    同一时刻只有一个批次的切片在推理中，检测框累计过多时提前做一次NMS压缩，
+    峰值内存与图纸大小无关。
+    """
+
+    def __init__(self, model, tile_size=1024, overlap=256, batch_size=8, conf=0.25,
+                 iou_threshold=0.6, metric='ios', compact_threshold=4096):
+        """
+        Args:
+            model: 检测模型
+            tile_size: 切片边长（同时作为推理尺寸，切片不再缩放）
+            overlap: 相邻切片的重叠像素
+            batch_size: 每批推理的切片数量
+            conf: 置信度阈值
+            iou_threshold: 跨切片NMS阈值
+            metric: 跨切片NMS的重叠度量，'ios' 能合并被切片边界截断的框
+            compact_threshold: 累计检测框超过该数量时提前执行NMS
+        """
+        if overlap >= tile_size:
+            raise ValueError("切片重叠必须小于切片尺寸")
+        self.model = model
+        self.tile_size = int(tile_size)
+        self.overlap = int(overlap)
+        self.batch_size = max(1, int(batch_size))
+        self.conf = conf
+        self.iou_threshold = iou_threshold
+        self.metric = metric
+        self.compact_threshold = compact_threshold
+
+    def _predict_tiles(self, img, windows):
+        crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+        results = self.model.predict(crops, conf=self.conf, imgsz=self.tile_size)
+        boxes, scores, class_ids = [], [], []
+        names = None
+        for (x1, y1, _, _), result in zip(windows, results):
+            names = result.names
+            xyxy, conf, cls = result_to_arrays(result)
+            if len(xyxy) == 0:
+                continue
+            boxes.append(xyxy + np.array([x1, y1, x1, y1], dtype=np.float32))
+            scores.append(conf)
+            class_ids.append(cls)
+        return boxes, scores, class_ids, names
+
+    def _compact(self, boxes, scores, class_ids):
+        keep = nms(boxes, scores, self.iou_threshold, class_ids, metric=self.metric)
+        return boxes[keep], scores[keep], class_ids[keep]
+
+    def detect(self, img):
+        """执行切片推理
+        Returns:
+            (xyxy (N,4), conf (N,), class_names 列表)，坐标为全图坐标
+        """
+        height, width = img.shape[:2]
+        boxes = np.zeros((0, 4), dtype=np.float32)
+        scores = np.zeros((0,), dtype=np.float32)
+        class_ids = np.zeros((0,), dtype=np.int64)
+        names = {}
+
+        tile_count = 0
+        batch = []
+        windows = iter_tiles(width, height, self.tile_size, self.overlap)
+        while True:
+            window = next(windows, None)
+            if window is not None:
+                batch.append(window)
+            if batch and (window is None or len(batch) == self.batch_size):
+                tile_count += len(batch)
+                new_boxes, new_scores, new_ids, batch_names = self._predict_tiles(img, batch)
+                batch = []
+                names = batch_names or names
+                if new_boxes:
+                    boxes = np.concatenate([boxes] + new_boxes)
+                    scores = np.concatenate([scores] + new_scores)
+                    class_ids = np.concatenate([class_ids] + new_ids)
+                if len(boxes) > self.compact_threshold:
+                    boxes, scores, class_ids = self._compact(boxes, scores, class_ids)
+            if window is None:
+                break
+
+        boxes, scores, class_ids = self._compact(boxes, scores, class_ids)
+        logger.info(f"切片推理: {width}x{height}, {tile_count} 个切片, 保留 {len(boxes)} 个目标")
+        return boxes, scores, [names[int(c)] for c in class_ids]
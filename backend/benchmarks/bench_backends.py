@@ -0,0 +1,98 @@
+"""推理后端基准测试：对比 ONNX Runtime / OpenVINO 与 PyTorch 的结果一致性和吞吐量
+
+用法:
+    python -m backend.benchmarks.bench_backends --images training/data/imgs --backends onnxruntime openvino
+"""
+import os
+import time
+import argparse
+
+import numpy as np
+
+from backend.config.config import Config
+from backend.app.services.box_ops import result_to_arrays, pairwise_iou
+from backend.app.services.inference_backends import create_loader
+from backend.benchmarks.bench_cascade import load_images
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """按类别贪心匹配两组检测结果
+    Returns:
+        (匹配数, 匹配框的IoU列表, 匹配框的置信度差列表)
+    """
+    ref_boxes, ref_scores, ref_cls = reference
+    boxes, scores, cls = candidate
+    if len(ref_boxes) == 0 or len(boxes) == 0:
+        return 0, [], []
+    iou = pairwise_iou(ref_boxes, boxes)
+    iou[ref_cls[:, None] != cls[None, :]] = 0
+    matched, ious, conf_deltas = 0, [], []
+    used = np.zeros(len(boxes), dtype=bool)
+    for i in np.argsort(-ref_scores):
+        candidates = np.where(used, 0, iou[i])
+        j = int(candidates.argmax())
+        if candidates[j] >= iou_threshold:
+            used[j] = True
+            matched += 1
+            ious.append(float(candidates[j]))
+            conf_deltas.append(abs(float(ref_scores[i]) - float(scores[j])))
+    return matched, ious, conf_deltas
+
+
+def run(model, images, conf, imgsz, batch_size):
+    outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        results = model.predict(images[i:i + batch_size], conf=conf, imgsz=imgsz, verbose=False)
+        outputs.extend(result_to_arrays(result) for result in results)
+    return outputs, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推理后端一致性与吞吐量基准测试')
+    parser.add_argument('--weights', default=Config.MODEL_PATH)
+    parser.add_argument('--images', default=os.path.join('training', 'data', 'imgs'))
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--backends', nargs='+', default=['onnxruntime'])
+    parser.add_argument('--conf', type=float, default=Config.DETECTION_CONF)
+    parser.add_argument('--imgsz', type=int, default=Config.DETECTION_IMGSZ)
+    parser.add_argument('--batch', type=int, default=1)
+    parser.add_argument('--intra-threads', type=int, default=Config.INFERENCE_INTRA_OP_THREADS)
+    parser.add_argument('--inter-threads', type=int, default=Config.INFERENCE_INTER_OP_THREADS)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        raise SystemExit(f"未在 {args.images} 中找到图像")
+
+    from ultralytics import YOLO
+    torch_model = YOLO(args.weights)
+    torch_model.predict(images[0], conf=args.conf, imgsz=args.imgsz, verbose=False)
+    reference, torch_time = run(torch_model, images, args.conf, args.imgsz, args.batch)
+    total_ref = sum(len(r[0]) for r in reference)
+    print(f"图像数: {len(images)}, 批大小: {args.batch}, 输入尺寸: {args.imgsz}")
+    print(f"{'torch':<12} {len(images) / torch_time:7.2f} 张/秒, 目标数 {total_ref}")
+
+    for backend in args.backends:
+        loader = create_loader(backend, imgsz=args.imgsz, intra_op_threads=args.intra_threads,
+                               inter_op_threads=args.inter_threads)
+        model = loader(args.weights)
+        model.predict(images[0], conf=args.conf, imgsz=args.imgsz)
+        outputs, elapsed = run(model, images, args.conf, args.imgsz, args.batch)
+
+        matched, ious, conf_deltas = 0, [], []
+        for ref, out in zip(reference, outputs):
+            m, i, d = match_detections(ref, out)
+            matched += m
+            ious.extend(i)
+            conf_deltas.extend(d)
+        total = sum(len(o[0]) for o in outputs)
+        recall = matched / total_ref if total_ref else 1.0
+        precision = matched / total if total else 1.0
+        print(f"{backend:<12} {len(images) / elapsed:7.2f} 张/秒 ({torch_time / elapsed:.2f}x), 目标数 {total}, "
+              f"与torch一致: 召回 {recall:.3f} 精确 {precision:.3f}, "
+              f"平均IoU {np.mean(ious) if ious else 0:.4f}, 最大置信度差 {max(conf_deltas, default=0):.4f}")
+
+
+if __name__ == '__main__':
+    main()
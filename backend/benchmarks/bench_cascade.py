@@ -0,0 +1,91 @@
+"""级联检测基准测试：对比单模型整图检测与两阶段级联检测的吞吐量
+
+用法:
+    python -m backend.benchmarks.bench_cascade --images training/data/imgs --limit 50
+"""
+import os
+import glob
+import time
+import argparse
+
+import cv2
+
+from backend.config.config import Config
+from backend.app.services.model_registry import ModelRegistry
+from backend.app.services.cascade import CascadeDetector
+from backend.app.services.box_ops import result_to_arrays
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+
+def load_images(image_dir, limit):
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(image_dir, pattern)))
+    paths = sorted(paths)[:limit]
+    images = [cv2.imread(path) for path in paths]
+    return [img for img in images if img is not None]
+
+
+def build_cascade(registry, conf, imgsz):
+    proposal = registry.get(Config.CASCADE_PROPOSAL_MODEL_PATH)
+    specialists = {}
+    default_specialist = None
+    if os.path.exists(Config.TOWER_CRANE_MODEL_PATH):
+        specialists['塔吊'] = registry.get(Config.TOWER_CRANE_MODEL_PATH).model
+    if os.path.exists(Config.OTHER_MODEL_PATH):
+        default_specialist = registry.get(Config.OTHER_MODEL_PATH).model
+    return proposal.model, CascadeDetector(
+        proposal.model,
+        specialists=specialists,
+        default_specialist=default_specialist,
+        proposal_max_side=Config.CASCADE_PROPOSAL_MAX_SIDE,
+        proposal_conf=Config.CASCADE_PROPOSAL_CONF,
+        conf=conf,
+        imgsz=imgsz,
+        margin=Config.CASCADE_REGION_MARGIN
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='级联检测吞吐量基准测试')
+    parser.add_argument('--images', default=os.path.join('training', 'data', 'imgs'))
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--conf', type=float, default=Config.DETECTION_CONF)
+    parser.add_argument('--imgsz', type=int, default=Config.DETECTION_IMGSZ)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        raise SystemExit(f"未在 {args.images} 中找到图像")
+
+    registry = ModelRegistry(Config.MODEL_DIR, max_resident=3)
+    model, cascade = build_cascade(registry, args.conf, args.imgsz)
+
+    # 预热，避免首轮初始化开销计入结果
+    model.predict(images[0], conf=args.conf, imgsz=args.imgsz, verbose=False)
+    cascade.detect(images[0])
+
+    start = time.perf_counter()
+    single_counts = []
+    for img in images:
+        result = model.predict(img, conf=args.conf, imgsz=args.imgsz, verbose=False)[0]
+        single_counts.append(len(result_to_arrays(result)[0]))
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cascade_counts = []
+    for img in images:
+        boxes, _, _ = cascade.detect(img)
+        cascade_counts.append(len(boxes))
+    cascade_time = time.perf_counter() - start
+
+    pixels = sum(img.shape[0] * img.shape[1] for img in images) / len(images)
+    print(f"图像数: {len(images)}, 平均像素: {pixels / 1e6:.1f} MP")
+    print(f"单模型整图: {single_time:.2f}s, {len(images) / single_time:.2f} 张/秒, 目标数 {sum(single_counts)}")
+    print(f"两阶段级联: {cascade_time:.2f}s, {len(images) / cascade_time:.2f} 张/秒, 目标数 {sum(cascade_counts)}")
+    print(f"吞吐量提升: {single_time / cascade_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""标签渲染基准测试：对比原PIL整图往返实现与缓存标签渲染器
+
+用法:
+    python -m backend.benchmarks.bench_label_renderer --width 6000 --height 4000 --boxes 50
+"""
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from backend.app.services.label_renderer import LabelRenderer
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fonts', 'SimHei.ttf')
+LABELS = ['塔吊', '起重机', '挖掘机', '搅拌机', '宿舍', '办公室', '厕所', '钢筋加工厂', '楼梯', '大门', '红线', '道路']
+COLORS = [(255, 0, 0), (0, 255, 0), (255, 128, 0), (255, 0, 255), (0, 255, 255), (255, 255, 0)]
+
+
+def legacy_draw_chinese_text(img, text, pos, color, box_width, font_path):
+    """原实现：每个标签都做整图BGR->PIL->RGBA叠加->BGR的往返"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    img_height, img_width = img.shape[:2]
+    base_size = min(img_width, img_height)
+    font_size = int(min(base_size * 0.03, box_width * 0.3))
+    font_size = max(font_size, 12)
+
+    img_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(img_pil)
+    font = ImageFont.truetype(font_path, font_size)
+
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+
+    x, y = pos
+    padding = font_size // 4
+    background_coords = [
+        max(0, x - padding),
+        max(0, y - padding),
+        min(img_width, x + text_width + padding),
+        min(img_height, y + text_height + padding)
+    ]
+
+    overlay = Image.new('RGBA', img_pil.size, (0, 0, 0, 0))
+    overlay_draw = ImageDraw.Draw(overlay)
+    overlay_draw.rectangle(background_coords, fill=(0, 0, 0, 128))
+    img_pil = Image.alpha_composite(img_pil.convert('RGBA'), overlay)
+
+    draw = ImageDraw.Draw(img_pil)
+    draw.text(pos, text, font=font, fill=color)
+    return cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
+
+
+def make_boxes(width, height, count, seed=0):
+    rng = np.random.default_rng(seed)
+    boxes = []
+    for i in range(count):
+        w = int(rng.integers(80, 600))
+        h = int(rng.integers(80, 600))
+        x1 = int(rng.integers(0, width - w))
+        y1 = int(rng.integers(0, height - h))
+        boxes.append((x1, y1, w, LABELS[i % len(LABELS)], COLORS[i % len(COLORS)]))
+    return boxes
+
+
+def run(draw_fn, img, boxes, repeat):
+    timings = []
+    for _ in range(repeat):
+        canvas = img.copy()
+        start = time.perf_counter()
+        for x1, y1, w, label, color in boxes:
+            canvas = draw_fn(canvas, label, (x1, max(y1 - 5, 0)), color, w)
+        timings.append(time.perf_counter() - start)
+    return canvas, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='标签渲染基准测试')
+    parser.add_argument('--width', type=int, default=6000)
+    parser.add_argument('--height', type=int, default=4000)
+    parser.add_argument('--boxes', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--font', default=FONT_PATH)
+    args = parser.parse_args()
+
+    img = np.full((args.height, args.width, 3), 255, dtype=np.uint8)
+    boxes = make_boxes(args.width, args.height, args.boxes)
+
+    renderer = LabelRenderer(args.font)
+    legacy_img, legacy_times = run(
+        lambda *a: legacy_draw_chinese_text(*a, font_path=args.font), img, boxes, args.repeat)
+    cached_img, cached_times = run(renderer.draw, img, boxes, args.repeat)
+
+    legacy_best = min(legacy_times)
+    cached_best = min(cached_times)
+    diff = np.abs(legacy_img.astype(np.int16) - cached_img.astype(np.int16))
+
+    print(f"图像尺寸: {args.width}x{args.height}, 标签数: {args.boxes}, 重复: {args.repeat}")
+    print(f"原PIL整图往返: {legacy_best * 1000:.1f} ms ({legacy_best / args.boxes * 1000:.2f} ms/标签)")
+    print(f"缓存标签渲染器: {cached_best * 1000:.1f} ms ({cached_best / args.boxes * 1000:.3f} ms/标签)")
+    print(f"加速比: {legacy_best / cached_best:.1f}x")
+    print(f"像素差异: 最大 {int(diff.max())}, 平均 {diff.mean():.4f}")
+    print(f"缓存统计: {renderer.get_stats()}")
+
+
+if __name__ == '__main__':
+    main()
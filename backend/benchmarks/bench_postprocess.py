@@ -0,0 +1,129 @@
+"""检测结果后处理基准测试：对比逐框处理与向量化后处理的单框开销
+
+用法:
+    python -m backend.benchmarks.bench_postprocess --counts 10 100 1000
+"""
+import time
+import argparse
+
+import numpy as np
+
+from backend.app.services.postprocess import DetectionPostprocessor
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+NAMES = {0: '起重机', 1: '宿舍', 2: '挖掘机', 3: '大门', 4: '搅拌机', 5: '办公室',
+         6: '红线', 7: '道路', 8: '楼梯', 9: '钢筋加工厂', 10: '塔吊', 11: '厕所'}
+
+CATEGORY_MAPPING = {
+    '塔吊': {'name': '塔吊', 'category': '垂直运输机械', 'color': '#FF4D4F'},
+    '起重机': {'name': '起重机', 'category': '施工机械', 'color': '#FFA940'},
+    '挖掘机': {'name': '挖掘机', 'category': '施工机械', 'color': '#FFA940'},
+    '搅拌机': {'name': '搅拌机', 'category': '施工机械', 'color': '#FFA940'},
+    '宿舍': {'name': '宿舍', 'category': '临时设施-生活及办公区', 'color': '#73D13D'},
+    '办公室': {'name': '办公室', 'category': '临时设施-生活及办公区', 'color': '#73D13D'},
+    '厕所': {'name': '厕所', 'category': '临时设施-生活及办公区', 'color': '#73D13D'},
+    '钢筋加工厂': {'name': '钢筋加工厂', 'category': '临时设施-生产加工区', 'color': '#40A9FF'},
+    '楼梯': {'name': '楼梯', 'category': '临时设施-辅助设施', 'color': '#9254DE'},
+    '大门': {'name': '大门', 'category': '基础设施', 'color': '#36CFC9'},
+    '红线': {'name': '红线', 'category': '基础设施', 'color': '#36CFC9'},
+    '道路': {'name': '道路', 'category': '基础设施', 'color': '#36CFC9'}
+}
+
+
+def legacy_postprocess(data, names):
+    """原实现：逐框访问张量，循环内重建颜色表"""
+    detections = []
+    class_counts = {}
+    for i in range(len(data)):
+        x1, y1, x2, y2 = data[i:i + 1, :4][0].tolist()
+        conf = data[i:i + 1, 4][0].item()
+        cls = data[i:i + 1, 5][0].item()
+        class_name = names[int(cls)]
+
+        category_info = CATEGORY_MAPPING.get(class_name, {'name': class_name, 'category': '其他', 'color': '#666666'})
+        category_name = category_info['category']
+        display_name = category_info['name']
+
+        if category_name not in class_counts:
+            class_counts[category_name] = {'count': 1, 'items': [display_name]}
+        else:
+            class_counts[category_name]['count'] += 1
+            if display_name not in class_counts[category_name]['items']:
+                class_counts[category_name]['items'].append(display_name)
+
+        HIGH_SATURATION_COLORS = {
+            '起重机': (255, 0, 0), '塔吊': (0, 255, 0), '挖掘机': (255, 128, 0), '大门': (255, 0, 255),
+            '搅拌机': (0, 255, 255), '办公室': (255, 255, 0), '红线': (255, 0, 0), '道路': (128, 0, 255),
+            '楼梯': (0, 128, 255), '钢筋加工厂': (255, 64, 0), '宿舍': (0, 255, 128), '厕所': (128, 255, 0)
+        }
+        color = HIGH_SATURATION_COLORS.get(display_name, (0, 0, 255))
+
+        detections.append({
+            'bbox': [int(x1), int(y1), int(x2), int(y2)],
+            'confidence': float(conf),
+            'class': display_name,
+            'category': category_name,
+            'color': color
+        })
+    return detections, class_counts
+
+
+def vectorized_postprocess(postprocessor, data, names):
+    """新实现：一次性转换为NumPy数组后查表"""
+    if torch is not None and isinstance(data, torch.Tensor):
+        data = data.cpu().numpy()
+    return postprocessor.build(data[:, :4], data[:, 4], data[:, 5].astype(np.int64), names)
+
+
+def make_data(count, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 5000, size=(count, 2))
+    wh = rng.uniform(20, 600, size=(count, 2))
+    conf = rng.uniform(0.25, 1.0, size=(count, 1))
+    cls = rng.integers(0, len(NAMES), size=(count, 1))
+    return np.hstack([xy, xy + wh, conf, cls]).astype(np.float32)
+
+
+def best_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检测结果后处理基准测试')
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    colors = {'起重机': (255, 0, 0), '塔吊': (0, 255, 0), '挖掘机': (255, 128, 0), '大门': (255, 0, 255),
+              '搅拌机': (0, 255, 255), '办公室': (255, 255, 0), '红线': (255, 0, 0), '道路': (128, 0, 255),
+              '楼梯': (0, 128, 255), '钢筋加工厂': (255, 64, 0), '宿舍': (0, 255, 128), '厕所': (128, 255, 0)}
+    postprocessor = DetectionPostprocessor(CATEGORY_MAPPING, colors)
+    backend = 'torch' if torch is not None else 'numpy'
+    print(f"张量后端: {backend}, 重复: {args.repeat}")
+
+    for count in args.counts:
+        array = make_data(count)
+        data = torch.from_numpy(array) if torch is not None else array
+
+        legacy = legacy_postprocess(data, NAMES)
+        vectorized = vectorized_postprocess(postprocessor, data, NAMES)
+        assert legacy == vectorized, "向量化结果与逐框结果不一致"
+
+        legacy_time = best_time(lambda: legacy_postprocess(data, NAMES), args.repeat)
+        vectorized_time = best_time(lambda: vectorized_postprocess(postprocessor, data, NAMES), args.repeat)
+        print(f"{count:>5} 个目标: 逐框 {legacy_time / count * 1e6:8.2f} us/框, "
+              f"向量化 {vectorized_time / count * 1e6:8.2f} us/框, "
+              f"加速比 {legacy_time / vectorized_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
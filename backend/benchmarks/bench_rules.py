@@ -0,0 +1,60 @@
+"""规则检查基准测试：按检测数量分别测量不使用结果缓存（规则实际计算）和
+重复检查同一组检测结果（全部命中缓存）时 check_rules 的耗时
+
+用法:
+    python -m backend.benchmarks.bench_rules --counts 50 200 500
+"""
+import time
+import argparse
+
+import numpy as np
+
+from backend.app.services.rules_checker import RulesChecker
+
+CLASSES = ('塔吊', '钢筋加工厂', '大门', '道路', '施工道路', '楼梯', '红线', '主楼',
+           '洗车池', '三级沉淀池', '材料堆场', '危险品堆场', '办公室', '宿舍', '厕所')
+
+
+def make_detections(count, size=5000, seed=0):
+    """在 size x size 的图纸上随机生成检测结果，红线覆盖大部分图纸"""
+    rng = np.random.default_rng(seed)
+    detections = [{'class': '红线', 'bbox': [50, 50, size - 50, size - 50]}]
+    for _ in range(count - 1):
+        x, y = rng.integers(0, size, 2)
+        w, h = rng.integers(10, 400, 2)
+        detections.append({'class': CLASSES[rng.integers(len(CLASSES))],
+                           'bbox': [int(x), int(y), int(x + w), int(y + h)]})
+    return detections
+
+
+def measure(checker, detections, repeat):
+    """预热一次后重复检查，返回 (最短耗时毫秒, 最后一次的结果)"""
+    checker.check_rules(detections)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = checker.check_rules(detections)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return min(timings), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='规则检查基准测试')
+    parser.add_argument('--counts', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    # 不缓存的检查器测量规则计算本身，带缓存的检查器测量重复检查的命中路径
+    uncached = RulesChecker(cache_size=0)
+    cached = RulesChecker()
+    for count in args.counts:
+        detections = make_detections(count)
+        uncached_ms, results = measure(uncached, detections, args.repeat)
+        cached_ms, _ = measure(cached, detections, args.repeat)
+        slowest = sorted(results, key=lambda r: -r['elapsed_ms'])[:3]
+        print(f"{count:>5} 个目标: 未缓存 {uncached_ms:7.2f} ms, 命中缓存 {cached_ms:7.2f} ms, 最慢的规则: " +
+              ', '.join(f"{r['rule_id']} {r['elapsed_ms']:.2f} ms" for r in slowest))
+
+
+if __name__ == '__main__':
+    main()
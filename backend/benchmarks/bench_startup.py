@@ -0,0 +1,52 @@
+"""启动耗时基准测试：在全新子进程中分别测量导入、创建应用和加载模型的耗时
+
+用法（在项目根目录执行）:
+    python -m backend.benchmarks.bench_startup --repeat 3
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import backend.app
+import_ms = (time.perf_counter() - start) * 1000.0
+heavy = sorted(m for m in ('torch', 'ultralytics', 'shapely', 'requests') if m in __import__('sys').modules)
+start = time.perf_counter()
+app = backend.app.create_app(preload={preload!r})
+create_ms = (time.perf_counter() - start) * 1000.0
+timings = app.config['STARTUP_TIMINGS']
+print(json.dumps({{'import_ms': import_ms, 'create_app_ms': create_ms,
+                  'model_load_ms': timings.get('model_load_ms'), 'heavy_modules': heavy}}))
+"""
+
+
+def probe(preload):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(preload=preload)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--modes', nargs='+', default=['lazy', 'sync'])
+    args = parser.parse_args()
+
+    for preload in args.modes:
+        runs = [probe(preload) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r['import_ms'] + r['create_app_ms'])
+        model_load = f"{best['model_load_ms']:.0f} ms" if best['model_load_ms'] is not None else '未加载'
+        print(f"preload={preload:<10} 导入 {best['import_ms']:7.0f} ms, 创建应用 {best['create_app_ms']:7.0f} ms, "
+              f"模型加载 {model_load}, 导入后已加载的重型模块: {best['heavy_modules'] or '无'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,6 @@ import logging
 
 # 基础路径配置
 BASE_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-print("当前目录：" + BASE_DIR)
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 
 # 确保上传文件夹存在
@@ -24,8 +23,91 @@ class Config:
     # 确保模型目录存在
     os.makedirs(MODEL_DIR, exist_ok=True)
     
-    # 单一模型配置
-    MODEL_PATH = os.path.join(MODEL_DIR, 'best.pt')
+    # 默认模型配置
+    # 也可指向 backend.quantize 生成的 INT8 模型（如 best_int8.onnx），由 ONNX Runtime 加载
+    MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(MODEL_DIR, 'best.pt'))
+    MODEL_MAX_RESIDENT = int(os.environ.get('MODEL_MAX_RESIDENT', 3))  # 最多常驻内存的模型数量
+    # 预热配置：用合成图像在各推理尺寸和批大小上预先推理，完成后才报告就绪
+    WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', '1') == '1'
+    WARMUP_ITERATIONS = int(os.environ.get('WARMUP_ITERATIONS', 2))  # 每个尺寸/批大小组合的推理次数
+    WARMUP_SIZES = os.environ.get('WARMUP_SIZES', '')  # 逗号分隔的推理尺寸，为空时按检测模式推断
+    WARMUP_BATCH_SIZES = os.environ.get('WARMUP_BATCH_SIZES', '')  # 逗号分隔的批大小，为空时为 1 和最大批大小
+    # 默认模型的加载时机: sync 在 create_app 中同步加载 / background 应用启动后在后台线程加载 / lazy 首次请求时加载
+    MODEL_PRELOAD = os.environ.get('MODEL_PRELOAD', 'background')
+    TOWER_CRANE_MODEL_PATH = os.path.join(MODEL_DIR, 'tower_crane.pt')  # 塔吊专用模型
+    OTHER_MODEL_PATH = os.path.join(MODEL_DIR, 'other.pt')  # 其他类别专用模型
+    
+    # 检测模式: single 单模型 / cascade 两阶段级联 / tiled 切片推理
+    DETECTION_MODE = os.environ.get('DETECTION_MODE', 'single')
+    CASCADE_PROPOSAL_MODEL_PATH = MODEL_PATH  # 级联第一阶段通用模型
+    CASCADE_PROPOSAL_MAX_SIDE = int(os.environ.get('CASCADE_PROPOSAL_MAX_SIDE', 640))  # 第一阶段缩小后的最长边
+    CASCADE_PROPOSAL_CONF = float(os.environ.get('CASCADE_PROPOSAL_CONF', 0.1))  # 第一阶段置信度阈值
+    CASCADE_REGION_MARGIN = float(os.environ.get('CASCADE_REGION_MARGIN', 0.2))  # 候选区域扩展比例
+    
+    # 切片推理配置（DETECTION_MODE=tiled 或请求参数 mode=tiled）
+    TILE_SIZE = int(os.environ.get('TILE_SIZE', 1024))  # 切片边长(像素)
+    TILE_OVERLAP = int(os.environ.get('TILE_OVERLAP', 256))  # 相邻切片重叠(像素)
+    TILE_BATCH_SIZE = int(os.environ.get('TILE_BATCH_SIZE', 8))  # 每批推理的切片数
+    TILE_NMS_THRESHOLD = float(os.environ.get('TILE_NMS_THRESHOLD', 0.6))  # 跨切片NMS阈值
+    
+    # 推理后端: torch (ultralytics PyTorch) / onnxruntime / openvino
+    # 非torch后端首次加载时把 .pt 导出到权重文件旁（best.onnx / best_openvino_model/），之后直接复用
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch')
+    INFERENCE_INTRA_OP_THREADS = int(os.environ.get('INFERENCE_INTRA_OP_THREADS', 0))  # 算子内并行线程数，0为自动
+    INFERENCE_INTER_OP_THREADS = int(os.environ.get('INFERENCE_INTER_OP_THREADS', 0))  # 算子间并行线程数，0为自动
+    
+    # 推理参数（参与检测结果缓存键的计算）
+    DETECTION_CONF = float(os.environ.get('DETECTION_CONF', 0.25))  # 置信度阈值
+    DETECTION_IMGSZ = int(os.environ.get('DETECTION_IMGSZ', 640))  # 推理输入尺寸
+    
+    # 动态微批处理配置
+    BATCH_MAX_SIZE = int(os.environ.get('DETECTION_BATCH_MAX_SIZE', 8))  # 单批最大图片数
+    BATCH_MAX_WAIT_MS = float(os.environ.get('DETECTION_BATCH_MAX_WAIT_MS', 10))  # 凑批最长等待时间(毫秒)
+    
+    # 检测流水线配置：解码/预处理线程池 -> 单线程推理（即微批处理调度器）-> 后处理/编码线程池
+    PIPELINE_PREPROCESS_WORKERS = int(os.environ.get('DETECTION_PIPELINE_PREPROCESS_WORKERS', 2))  # 解码/预处理线程数
+    PIPELINE_POSTPROCESS_WORKERS = int(os.environ.get('DETECTION_PIPELINE_POSTPROCESS_WORKERS', 2))  # 标注/编码线程数
+    PIPELINE_QUEUE_SIZE = int(os.environ.get('DETECTION_PIPELINE_QUEUE_SIZE', 16))  # 各阶段输入队列容量，满时阻塞上游
+    PIPELINE_RULES_WORKERS = int(os.environ.get('DETECTION_PIPELINE_RULES_WORKERS', 2))  # 检测并检查规则时与标注/编码并行的规则检查线程数
+    
+    # 检测结果缓存配置
+    CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+    CACHE_MAX_BYTES = int(os.environ.get('DETECTION_CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 缓存字节预算，默认1GB
+    CACHE_POLICY = os.environ.get('DETECTION_CACHE_POLICY', 'lru')  # 淘汰策略: lru / lfu
+    
+    # 标注图像编码配置
+    IMAGE_FORMAT = os.environ.get('DETECTION_IMAGE_FORMAT', 'png')  # 默认输出格式: png / jpeg / webp
+    PNG_COMPRESSION = int(os.environ.get('DETECTION_PNG_COMPRESSION', 1))  # PNG压缩级别(0-9)，与OpenCV默认一致，越高越小越慢
+    JPEG_QUALITY = int(os.environ.get('DETECTION_JPEG_QUALITY', 90))  # JPEG质量(1-100)
+    WEBP_QUALITY = int(os.environ.get('DETECTION_WEBP_QUALITY', 90))  # WebP质量(1-100)
+    USE_TURBOJPEG = os.environ.get('DETECTION_USE_TURBOJPEG', '1') == '1'  # 安装了PyTurboJPEG时用其编码JPEG
+    
+    # 批量检测接口配置
+    BATCH_UPLOAD_MAX_FILES = int(os.environ.get('DETECTION_BATCH_UPLOAD_MAX_FILES', 200))  # 单次请求最多图片数
+    BATCH_UPLOAD_MAX_ZIP_ENTRIES = int(os.environ.get('DETECTION_BATCH_UPLOAD_MAX_ZIP_ENTRIES', 1000))  # ZIP压缩包最多条目数（含非图片）
+    BATCH_UPLOAD_MAX_IMAGE_BYTES = int(os.environ.get('DETECTION_BATCH_UPLOAD_MAX_IMAGE_BYTES', 50 * 1024 * 1024))  # ZIP中单张图片解压后的最大字节数
+    BATCH_UPLOAD_MAX_TOTAL_BYTES = int(os.environ.get('DETECTION_BATCH_UPLOAD_MAX_TOTAL_BYTES', 512 * 1024 * 1024))  # 单次请求解压后的图片总字节数上限
+    BATCH_UPLOAD_WORKERS = int(os.environ.get('DETECTION_BATCH_UPLOAD_WORKERS', BATCH_MAX_SIZE))  # 并行处理的图片数
+    
+    # 异步检测任务配置
+    JOB_WORKERS = int(os.environ.get('DETECTION_JOB_WORKERS', 2))  # 提交线程数，只负责把任务提交到检测流水线，不等待推理
+    JOB_QUEUE_SIZE = int(os.environ.get('DETECTION_JOB_QUEUE_SIZE', 16))  # 等待队列容量，满时异步接口返回429，同步接口排队等待
+    JOB_RESULT_TTL = int(os.environ.get('DETECTION_JOB_RESULT_TTL', 600))  # 任务结果保留时间(秒)
+    JOB_SYNC_TIMEOUT = float(os.environ.get('DETECTION_JOB_SYNC_TIMEOUT', 300))  # 同步接口等待任务的超时(秒)
+    
+    # 施工规范检查规则文件（条文见项目根目录的 施工规范.txt），新增或调整规则只需修改该文件；
+    # 放在 backend 目录下，随 Docker 镜像（构建上下文为 backend/）一起打包
+    RULES_PATH = os.environ.get('RULES_PATH', os.path.join(BASE_DIR, 'config', '施工规范规则.json'))
+    RULES_CACHE_SIZE = int(os.environ.get('RULES_CACHE_SIZE', 4096))  # 缓存的单条规则结果数，0为不缓存
+    
+    # 生产部署配置（gunicorn -c backend/gunicorn.conf.py backend.wsgi:app）
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 2))  # 工作进程数，模型权重在fork前加载并共享，结果缓存和异步任务经缓存目录共享；大于1时不支持在线切换模型
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))  # 每个工作进程的线程数
+    SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 1000))  # 处理多少请求后回收工作进程，0为不回收
+    SERVER_MAX_REQUESTS_JITTER = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 100))  # 回收阈值的随机抖动
+    SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', 300))  # 单个请求的超时(秒)
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 60))  # 回收时等待进行中请求的时间(秒)
+    TORCH_NUM_THREADS = int(os.environ.get('TORCH_NUM_THREADS', 0))  # 每个工作进程的推理线程数，0为不限制
     
     UPLOAD_FOLDER = UPLOAD_FOLDER
     LOG_FILE = os.path.join(BASE_DIR, 'logs', 'app.log')
@@ -0,0 +1,60 @@
+"""gunicorn 生产部署配置
+
+用法（在项目根目录执行）:
+    gunicorn -c backend/gunicorn.conf.py backend.wsgi:app
+
+主进程预加载应用和模型权重后再 fork 工作进程，权重所在的内存页由各工作进程
+写时复制共享，N 个工作进程不会占用 N 份模型内存。工作进程处理一定数量的请求
+后平滑退出并由主进程重新 fork，新进程同样从主进程继承已加载的权重。
+
+检测结果缓存和异步任务的状态、结果通过共享目录在工作进程间可见，默认启动 2 个
+工作进程。模型切换只能作用于单个工作进程，多于 1 个工作进程时切换接口返回409，
+需通过环境变量 MODEL_PATH 指定模型。
+"""
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.config.config import Config
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+workers = Config.SERVER_WORKERS
+threads = Config.SERVER_THREADS
+worker_class = 'gthread'
+
+# fork 前加载应用（包括模型权重）
+preload_app = True
+
+# 处理指定数量的请求后回收工作进程，加入随机抖动避免所有进程同时重启
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = Config.SERVER_MAX_REQUESTS_JITTER
+
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def pre_fork(server, worker):
+    # 将预加载阶段创建的对象移出GC跟踪，避免子进程中的垃圾回收触碰这些页面引起写时复制
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # 线程、队列和锁不能跨 fork 使用，在工作进程中重新创建
+    from backend.app.services.detection import detection_service
+    detection_service.after_fork(server.cfg.workers)
+    # 在开始接收请求前预热，首个真实请求不再承担初始化开销
+    if Config.WARMUP_ENABLED:
+        detection_service.warmup()
+    server.log.info(f"工作进程 {worker.pid} 已就绪")
+
+
+def worker_exit(server, worker):
+    from backend.app.services.detection import detection_service
+    detection_service.shutdown()
@@ -0,0 +1,166 @@
+"""INT8训练后量化工具：量化训练好的权重，并在验证集上对比FP32模型的大小、延迟和精度
+
+用法（在项目根目录执行）:
+    python -m backend.quantize --weights backend/models/best.pt --images training/data/imgs --labels training/data/labels
+
+生成的 <名称>_int8.onnx 位于模型目录时会出现在可用模型列表中，可通过 /api/detection/model/switch
+切换，或设置环境变量 MODEL_PATH 作为默认模型。
+"""
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from backend.config.config import Config
+from backend.app.services.box_ops import result_to_arrays, pairwise_iou
+from backend.app.services.inference_backends import OnnxRuntimeModel, export_model
+from backend.app.services.quantization import CALIBRATION_METHODS, split_dataset, quantize_int8
+from backend.benchmarks.bench_backends import match_detections
+
+
+def load_labels(label_dir, image_path, width, height):
+    """读取YOLO格式标签（类别 cx cy w h，归一化），返回像素坐标的 (xyxy, 类别)"""
+    label_path = os.path.join(label_dir, os.path.splitext(os.path.basename(image_path))[0] + '.txt')
+    if not os.path.exists(label_path) or os.path.getsize(label_path) == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.int64)
+    labels = np.loadtxt(label_path, ndmin=2)
+    cxcy, wh = labels[:, 1:3], labels[:, 3:5]
+    boxes = np.concatenate([cxcy - wh / 2, cxcy + wh / 2], axis=1) * [width, height, width, height]
+    return boxes.astype(np.float32), labels[:, 0].astype(np.int64)
+
+
+def average_precision(predictions, ground_truths, iou_threshold=0.5):
+    """计算 mAP@IoU（全点插值）
+    Args:
+        predictions: 每张图像的 (xyxy, conf, cls)
+        ground_truths: 每张图像的 (xyxy, cls)
+    Returns:
+        (mAP, {类别: AP})
+    """
+    scores, hits, pred_cls = [], [], []
+    gt_counts = {}
+    for (boxes, confs, classes), (gt_boxes, gt_classes) in zip(predictions, ground_truths):
+        for c in gt_classes:
+            gt_counts[int(c)] = gt_counts.get(int(c), 0) + 1
+        tp = np.zeros(len(boxes), dtype=bool)
+        if len(boxes) and len(gt_boxes):
+            iou = pairwise_iou(boxes, gt_boxes)
+            iou[classes[:, None] != gt_classes[None, :]] = 0
+            used = np.zeros(len(gt_boxes), dtype=bool)
+            for i in np.argsort(-confs):
+                candidates = np.where(used, 0, iou[i])
+                j = int(candidates.argmax())
+                if candidates[j] >= iou_threshold:
+                    used[j] = True
+                    tp[i] = True
+        scores.append(confs)
+        hits.append(tp)
+        pred_cls.append(classes)
+
+    if not scores:
+        return 0.0, {}
+    scores, hits, pred_cls = np.concatenate(scores), np.concatenate(hits), np.concatenate(pred_cls)
+    per_class = {}
+    for c, total in gt_counts.items():
+        mask = pred_cls == c
+        order = np.argsort(-scores[mask])
+        tp = np.cumsum(hits[mask][order])
+        recall = np.concatenate([[0.0], tp / total, [1.0]])
+        precision = np.concatenate([[1.0], tp / np.arange(1, len(tp) + 1), [0.0]])
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        steps = np.where(recall[1:] != recall[:-1])[0]
+        per_class[c] = float(np.sum((recall[steps + 1] - recall[steps]) * precision[steps + 1]))
+    return (float(np.mean(list(per_class.values()))) if per_class else 0.0), per_class
+
+
+def evaluate(model, images, conf, imgsz):
+    """逐张推理，返回 (检测结果列表, 单张延迟毫秒列表)"""
+    if not images:
+        return [], []
+    model.predict(images[0], conf=conf, imgsz=imgsz, verbose=False)
+    outputs, latencies = [], []
+    for img in images:
+        start = time.perf_counter()
+        results = model.predict(img, conf=conf, imgsz=imgsz, verbose=False)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        outputs.append(result_to_arrays(results[0]))
+    return outputs, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='INT8训练后量化与FP32对比')
+    parser.add_argument('--weights', default=Config.MODEL_PATH)
+    parser.add_argument('--images', default=os.path.join('training', 'data', 'imgs'))
+    parser.add_argument('--labels', default=os.path.join('training', 'data', 'labels'))
+    parser.add_argument('--output', default=None, help='默认为权重旁的 <名称>_int8.onnx')
+    parser.add_argument('--val-fraction', type=float, default=0.2)
+    parser.add_argument('--calibration-size', type=int, default=200)
+    parser.add_argument('--val-limit', type=int, default=200)
+    parser.add_argument('--method', choices=CALIBRATION_METHODS, default='minmax')
+    parser.add_argument('--no-per-channel', action='store_true')
+    parser.add_argument('--quantize-head', action='store_true', help='检测头的解码部分也量化')
+    parser.add_argument('--skip-quantize', action='store_true', help='只评估已有的INT8模型')
+    parser.add_argument('--conf', type=float, default=Config.DETECTION_CONF)
+    parser.add_argument('--imgsz', type=int, default=Config.DETECTION_IMGSZ)
+    parser.add_argument('--threads', type=int, default=Config.INFERENCE_INTRA_OP_THREADS)
+    args = parser.parse_args()
+
+    train_paths, val_paths = split_dataset(args.images, args.val_fraction)
+    if not train_paths or not val_paths:
+        raise SystemExit(f"{args.images} 中的图像不足以划分校准集和验证集")
+    # 量化前读取验证图像，没有可用图像时不必执行耗时的量化
+    val_paths = val_paths[:args.val_limit]
+    images = [cv2.imread(path) for path in val_paths]
+    pairs = [(path, img) for path, img in zip(val_paths, images) if img is not None]
+    images = [img for _, img in pairs]
+    if not images:
+        raise SystemExit(f"没有可用的验证图像: 选取 {len(val_paths)} 张（--val-limit {args.val_limit}），均无法读取")
+    # 均匀抽样，避免校准集集中在文件名相近（往往是同一项目）的图纸上
+    step = max(1, len(train_paths) // args.calibration_size)
+    calibration_paths = train_paths[::step][:args.calibration_size]
+    int8_path = args.output or os.path.splitext(args.weights)[0] + '_int8.onnx'
+
+    if not args.skip_quantize:
+        start = time.perf_counter()
+        int8_path = quantize_int8(args.weights, calibration_paths, int8_path, imgsz=args.imgsz,
+                                  method=args.method, per_channel=not args.no_per_channel,
+                                  exclude_head=not args.quantize_head)
+        print(f"量化完成: {int8_path}（校准图像 {len(calibration_paths)} 张，耗时 {time.perf_counter() - start:.1f}s）")
+
+    has_labels = os.path.isdir(args.labels)
+    ground_truths = [load_labels(args.labels, path, img.shape[1], img.shape[0]) for path, img in pairs] \
+        if has_labels else None
+
+    from ultralytics import YOLO
+    fp32_onnx = export_model(args.weights, 'onnx', args.imgsz)
+    models = [
+        ('torch FP32', args.weights, YOLO(args.weights)),
+        ('onnx FP32', fp32_onnx, OnnxRuntimeModel(fp32_onnx, args.threads)),
+        ('onnx INT8', int8_path, OnnxRuntimeModel(int8_path, args.threads))
+    ]
+
+    print(f"验证图像: {len(images)} 张, 输入尺寸: {args.imgsz}, 置信度阈值: {args.conf}")
+    reference = None
+    for name, path, model in models:
+        outputs, latencies = evaluate(model, images, args.conf, args.imgsz)
+        line = (f"{name:<11} 大小 {os.path.getsize(path) / 1024 / 1024:7.1f} MB, "
+                f"延迟 中位 {np.median(latencies):7.1f} ms / P95 {np.percentile(latencies, 95):7.1f} ms")
+        if ground_truths is not None:
+            map50, _ = average_precision(outputs, ground_truths)
+            line += f", mAP@0.5 {map50:.4f}"
+        if reference is None:
+            reference = outputs
+            reference_map = map50 if ground_truths is not None else None
+        else:
+            matched = sum(match_detections(ref, out)[0] for ref, out in zip(reference, outputs))
+            total_ref = sum(len(r[0]) for r in reference)
+            line += f", 与FP32一致的目标 {matched}/{total_ref}"
+            if reference_map is not None:
+                line += f", mAP变化 {map50 - reference_map:+.4f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+
+from backend.app import create_app
+
+# 生产环境WSGI入口：gunicorn -c backend/gunicorn.conf.py backend.wsgi:app
+# 配合 preload_app，应用与模型权重在主进程中同步加载一次，fork 后各工作进程共享；
+# 预热会初始化推理后端（如CUDA上下文），不能在 fork 前进行，由 gunicorn 的 post_fork 在各工作进程中执行
+app = create_app(preload='sync', warmup=False)